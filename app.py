@@ -1,77 +1,1608 @@
 from flask import (
-    Flask, render_template, request, redirect, session, url_for, jsonify, g
+    Blueprint, Flask, render_template, request, redirect, session, url_for, jsonify, g,
+    Response, stream_with_context, abort, send_from_directory, current_app, has_app_context
 )
-from datetime import datetime
+from flask.ctx import RequestContext
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import atexit
+import base64
+import click
+import collections
+import contextlib
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import json
+import logging
+import queue
+import re
+import secrets
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+import sys
+import threading
+import time
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
 import os
 
+try:
+    import brotli
+except ImportError:  # optional: pages are served gzip'd only
+    brotli = None
+
+
 # -------------------- Config --------------------
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(APP_DIR, "mee_sahayam.db")
+SCHEMES_PATH = os.path.join(APP_DIR, "schemes.json")
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", 2.0))  # seconds between mtime checks
+
+# Connection pool (per process)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5.0))  # seconds to wait for a free connection
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+DB_EXECUTOR_THREADS = int(os.environ.get("DB_EXECUTOR_THREADS", DB_POOL_SIZE))  # run_db() threads for async views
+DB_PRAGMAS = (
+    # must precede journal_mode on a new file; older files switch with `flask archive-searches --full-vacuum`
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # safe with WAL; fsync only at checkpoints
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size = -16000",    # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Search log write-behind buffer
+SEARCH_LOG_ASYNC = os.environ.get("SEARCH_LOG_ASYNC", "1") == "1"  # set to 0 for synchronous writes (tests)
+SEARCH_LOG_BATCH = int(os.environ.get("SEARCH_LOG_BATCH", 200))
+SEARCH_LOG_INTERVAL = float(os.environ.get("SEARCH_LOG_INTERVAL", 0.5))  # max seconds a record waits
+SEARCH_LOG_QUEUE = int(os.environ.get("SEARCH_LOG_QUEUE", 10000))
+SEARCH_LOG_PUT_TIMEOUT = float(os.environ.get("SEARCH_LOG_PUT_TIMEOUT", 0.1))
+
+# Password hashing: werkzeug method string, so the cost is part of the config,
+# e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000". Changing it rehashes on next login.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_OFFLOAD = os.environ.get("PASSWORD_HASH_OFFLOAD", "1") == "1"  # 0 = hash in the request thread
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 2 * PASSWORD_HASH_WORKERS))
+
+# Admin listings
+USERS_PAGE_SIZE = 100
+USERS_PAGE_SIZE_MAX = 1000
+EXPORT_BATCH_SIZE = 5000
+IMPORT_BATCH_SIZE = 5000  # users validated, hashed and inserted per transaction
+
+# /account summaries cached per user; dropped on login, logout and signup
+ACCOUNT_CACHE = os.environ.get("ACCOUNT_CACHE", "1") == "1"  # 0 = query on every visit
+ACCOUNT_CACHE_TTL = float(os.environ.get("ACCOUNT_CACHE_TTL", 300))  # bounds staleness from other workers' writes
+ACCOUNT_CACHE_MAX_ENTRIES = int(os.environ.get("ACCOUNT_CACHE_MAX_ENTRIES", 10_000))
+
+# Chat history shown on /chatbot; older exchanges load from /chatbot/history
+CHAT_HISTORY_PAGE = 20
+CHAT_HISTORY_PAGE_MAX = 100
+CHATBOT_BATCH_MAX = 100  # messages per /chatbot_api/batch request (offline kiosks)
+
+# ASGI serving (`uvicorn --factory app:create_asgi_app`): the async chat views run on the event loop,
+# every other route runs as WSGI on a thread from this pool.
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+
+# Sessions: only a random id travels in the cookie, the data stays on the server.
+# "sqlite" is shared by all workers and survives restarts; "memory" is per process, so only for a
+# single-process server (logins are lost on restart); "cookie" is Flask's signed cookie.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_TTL = int(os.environ.get("SESSION_TTL", 7 * 24 * 3600))  # idle seconds before a session expires
+SESSION_TOUCH_INTERVAL = int(os.environ.get("SESSION_TOUCH_INTERVAL", 600))  # min seconds between expiry bumps
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", 100_000))  # memory backend LRU bound
+SESSION_PURGE_INTERVAL = int(os.environ.get("SESSION_PURGE_INTERVAL", 3600))  # sqlite backend expired-row sweep
+
+# Rendered-page cache and images
+PAGE_CACHE = os.environ.get("PAGE_CACHE", "1") == "1"  # 0 = render on every request
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".svg")
+IMAGE_WIDTHS = (96, 240, 480)  # resized variants served for ?w=
+IMAGE_CACHE_DIR = os.path.join(APP_DIR, ".image_cache")
+IMAGE_MAX_AGE = 365 * 24 * 3600  # fingerprinted URLs never change
+
+# Analytics rollups
+ROLLUP_BACKFILL_BATCH = 50_000  # rows folded into the rollups per transaction
+ANALYTICS_DAYS = 30
+ANALYTICS_DAYS_MAX = 366
+
+# Archival of old searches into monthly SQLite files (archive/searches-YYYY-MM.db)
+ARCHIVE_DIR = os.path.join(APP_DIR, "archive")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_BATCH = 5000  # rows moved per transaction
+VACUUM_STEP_PAGES = 2000  # pages released per incremental_vacuum step (~8 MB with 4 KB pages)
+
+# Server-sent alert streams (/category/<name>/alerts/stream), served under ASGI only
+SSE_BUFFER = int(os.environ.get("SSE_BUFFER", 32))  # frames queued per client before it is cut off
+SSE_HISTORY = int(os.environ.get("SSE_HISTORY", 256))  # recent alerts kept per category for Last-Event-ID
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15.0))  # seconds between keep-alive comments
+SSE_RETRY_MS = 3000  # client reconnect delay sent in the stream's first frame
+
+# Metrics
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))  # log statements slower than this
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# App factory: create_app(config) overrides these per app
+SECRET_KEY = os.environ.get("SECRET_KEY", "replace_this_with_a_random_secret_key")  # change in production
+MIGRATE_ON_START = os.environ.get("MIGRATE_ON_START", "0") == "1"  # 1 = migrate in create_app (development)
+
+# Routes, request hooks and CLI commands register on `bp`; create_app() builds the Flask app around it.
+bp = Blueprint("main", __name__, cli_group=None)
+logger = logging.getLogger(__name__)
+
+
+# -------------------- Metrics --------------------
+class Metrics:
+    """In-process counters and histograms, rendered in Prometheus text format.
+
+    Series are keyed by (name, labels) where labels is a tuple of
+    (key, value) pairs; updates take one lock and a dict lookup.
+    """
 
-app = Flask(__name__)
-app.secret_key = "replace_this_with_a_random_secret_key"  # change in production
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)  # buckets.., sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ""
+        esc = (lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def render(self, gauges=()):
+        """Prometheus exposition text; `gauges` adds (name, labels, value) point-in-time values."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        by_name = {}
+        for (name, labels), value in sorted(counters.items(), key=lambda kv: str(kv[0])):
+            by_name.setdefault(name, []).append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), series in sorted(histograms.items(), key=lambda kv: str(kv[0])):
+            lines = by_name.setdefault(name, [])
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {series[-2]}")
+            lines.append(f"{name}_count{self._labels(labels)} {series[-1]}")
+        for name, labels, value in gauges:
+            by_name.setdefault(name, []).append(f"{name}{self._labels(labels)} {value}")
+        out = []
+        for name in sorted(by_name):
+            kind, text = self._help.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(by_name[name])
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by endpoint.")
+metrics.describe("http_requests_total", "counter", "Requests by endpoint, method and status.")
+metrics.describe("db_query_duration_seconds", "histogram", "Time in execute() by statement verb.")
+metrics.describe("db_statement_seconds_total", "counter", "Time in execute() and fetches per SQL statement.")
+metrics.describe("db_rows_returned_total", "counter", "Rows fetched per SQL statement.")
+metrics.describe("db_slow_queries_total", "counter", f"Statements slower than {SLOW_QUERY_MS} ms.")
+metrics.describe("chatbot_category_total", "counter", "Chat messages by detected category.")
+metrics.describe("chatbot_intent_total", "counter", "Follow-up messages by detected intent.")
+metrics.describe("chatbot_fallback_total", "counter", "Chat messages answered with the fallback reply.")
+metrics.describe("chatbot_scheme_search_total", "counter", "Chat messages answered from the scheme search index.")
+metrics.describe("db_pool_connections", "gauge", "Pooled connections by state.")
+metrics.describe("db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection.")
+metrics.describe("db_pool_wait_max_seconds", "gauge", "Longest wait for a pooled connection.")
+metrics.describe("reply_cache_hits_total", "counter", "Message classification cache hits.")
+metrics.describe("reply_cache_misses_total", "counter", "Message classification cache misses.")
+metrics.describe("search_log_rows_total", "counter", "Search log rows by outcome.")
+metrics.describe("session_store_ops_total", "counter", "Server-side session store operations by kind.")
+metrics.describe("alert_stream_subscribers", "gauge", "Connected alert stream clients by category.")
+
+
+@bp.before_app_request
+def start_request_timer():
+    g._request_start = time.perf_counter()
+
+
+@bp.after_app_request
+def record_request_metrics(response):
+    start = g.pop("_request_start", None)
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("http_request_duration_seconds", (("endpoint", endpoint),), time.perf_counter() - start)
+        metrics.inc("http_requests_total", (("endpoint", endpoint), ("method", request.method),
+                                            ("status", response.status_code)))
+    return response
+
+
+@bp.teardown_app_request
+def record_failed_request(exception):
+    # after_request is skipped when a view raises; count those as 500s here
+    start = g.pop("_request_start", None)
+    if exception is not None and start is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("http_request_duration_seconds", (("endpoint", endpoint),), time.perf_counter() - start)
+        metrics.inc("http_requests_total", (("endpoint", endpoint), ("method", request.method), ("status", 500)))
 
 
 # -------------------- Database helpers --------------------
+def _sql_label(sql):
+    return " ".join(sql.split())[:120]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement and counts the rows fetched from it."""
+
+    _label = None
+    _verb = None
+    _elapsed = 0.0
+
+    def _start(self, sql):
+        self._label, self._elapsed = _sql_label(sql), 0.0
+        self._verb = self._label.split(" ", 1)[0].upper()
+        return time.perf_counter()
+
+    def _executed(self, started):
+        metrics.observe("db_query_duration_seconds", (("verb", self._verb),), time.perf_counter() - started)
+        self._record(started)
+
+    def _record(self, started, rows=0):
+        took = time.perf_counter() - started
+        labels = (("sql", self._label),)
+        metrics.inc("db_statement_seconds_total", labels, took)
+        if rows:
+            metrics.inc("db_rows_returned_total", labels, rows)
+        before = self._elapsed
+        self._elapsed += took
+        threshold = SLOW_QUERY_MS / 1000
+        if self._elapsed > threshold >= before:
+            metrics.inc("db_slow_queries_total", labels)
+            logger.warning("slow query (%.1f ms so far): %s", self._elapsed * 1000, self._label)
+
+    def execute(self, sql, parameters=()):
+        started = self._start(sql)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = self._start(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._record(started, 1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including execute() shortcuts) are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """Process-local pool of tuned SQLite connections.
+
+    Connections are created lazily up to `size` and handed out LIFO so the
+    warmest page cache is reused. After a fork the child drops the parent's
+    connections and starts an empty pool.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256,
+                               factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            create = self._idle.empty() and self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._wait_for_idle()
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def _wait_for_idle(self):
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"no database connection free after {self.timeout}s")
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid != os.getpid():
+                return  # checked out before a fork; belongs to the parent
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_avg_ms": (self._wait_total / self._waits * 1000) if self._waits else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+            }
+
+
 def get_db():
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
+        db = g._database = app_state().pool.acquire()
     return db
 
 
-@app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, "_database", None)
+    db = g.pop("_database", None)
     if db is not None:
-        db.close()
+        app_state().pool.release(db)
+
+
+# ---- Non-blocking access for async views ----
+# SQLite has no async API, so async views hand their database work (and anything
+# else that may block: session stores, the search log queue) to a small thread pool
+# and await the result; the event loop keeps serving other requests meanwhile.
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db")
+
+
+def _with_pooled_connection(fn, args):
+    pool = app_state().pool
+    conn = pool.acquire()
+    try:
+        return fn(conn, *args)
+    finally:
+        pool.release(conn)
+
+
+async def run_db(fn, *args):
+    """Await fn(conn, *args) on a pooled connection, run in db_executor."""
+    return await run_blocking(_with_pooled_connection, fn, args)
+
+
+async def run_blocking(fn, *args):
+    """Await a blocking call in db_executor; it sees the caller's request context."""
+    import asyncio  # only needed once an async view runs
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(db_executor, ctx.run, fn, *args)
+
+
+def init_db(db=None):
+    """Bring the schema up to date (see migrate_db); returns the versions applied."""
+    return migrate_db(db or get_db())
+
+
+# ---- Schema migrations ----
+# Entry N upgrades the schema to version N; applied versions are recorded in the
+# schema_version table. Append new steps; never edit or reorder existing ones.
+MIGRATIONS = [
+    # 0: base tables
+    (
+        """CREATE TABLE IF NOT EXISTS users (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               name TEXT,
+               email TEXT UNIQUE,
+               phone TEXT,
+               password_hash TEXT,
+               signup_date TEXT,
+               last_login TEXT
+           )""",
+        """CREATE TABLE IF NOT EXISTS logins (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               login_time TEXT,
+               logout_time TEXT,
+               ip TEXT,
+               FOREIGN KEY(user_id) REFERENCES users(id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS searches (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               question TEXT,
+               reply TEXT,
+               category TEXT,
+               timestamp TEXT,
+               FOREIGN KEY(user_id) REFERENCES users(id)
+           )""",
+    ),
+    # 1: indexes for per-user history, stored email domain, counters kept by triggers
+    (
+        "ALTER TABLE users ADD COLUMN email_domain TEXT",
+        """UPDATE users SET email_domain =
+               CASE WHEN instr(email, '@') > 0 THEN substr(email, instr(email, '@') + 1) ELSE '' END""",
+        "CREATE INDEX IF NOT EXISTS idx_users_email_domain ON users(email_domain)",
+        "CREATE INDEX IF NOT EXISTS idx_users_signup_date ON users(signup_date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_logins_user_time ON logins(user_id, login_time)",
+        "CREATE INDEX IF NOT EXISTS idx_searches_user_time ON searches(user_id, timestamp)",
+        """CREATE TABLE IF NOT EXISTS domain_counts (
+               domain TEXT PRIMARY KEY,
+               count INTEGER NOT NULL
+           ) WITHOUT ROWID""",
+        """INSERT INTO domain_counts (domain, count)
+               SELECT email_domain, COUNT(*) FROM users GROUP BY email_domain""",
+        """CREATE TABLE IF NOT EXISTS counters (
+               name TEXT PRIMARY KEY,
+               value INTEGER NOT NULL
+           ) WITHOUT ROWID""",
+        "INSERT INTO counters (name, value) SELECT 'users', COUNT(*) FROM users",
+        """CREATE TRIGGER IF NOT EXISTS users_count_insert AFTER INSERT ON users BEGIN
+               INSERT INTO domain_counts (domain, count) VALUES (NEW.email_domain, 1)
+                   ON CONFLICT(domain) DO UPDATE SET count = count + 1;
+               UPDATE counters SET value = value + 1 WHERE name = 'users';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS users_count_delete AFTER DELETE ON users BEGIN
+               UPDATE domain_counts SET count = count - 1 WHERE domain = OLD.email_domain;
+               UPDATE counters SET value = value - 1 WHERE name = 'users';
+           END""",
+    ),
+    # 2: server-side sessions (SESSION_BACKEND=sqlite)
+    (
+        """CREATE TABLE IF NOT EXISTS sessions (
+               id TEXT PRIMARY KEY,
+               data TEXT NOT NULL,
+               expires REAL NOT NULL
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires)",
+    ),
+    # 3: analytics rollups kept by triggers; older rows are added by `flask backfill-rollups`
+    (
+        "ALTER TABLE searches ADD COLUMN intent TEXT",
+        """CREATE TABLE IF NOT EXISTS search_daily (
+               day TEXT NOT NULL,
+               category TEXT NOT NULL,  -- '' when the message named no category
+               intent TEXT NOT NULL,    -- '' when it was not a follow-up
+               count INTEGER NOT NULL,
+               PRIMARY KEY (day, category, intent)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS login_hourly (
+               hour TEXT PRIMARY KEY,   -- YYYY-MM-DDTHH (UTC)
+               count INTEGER NOT NULL
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_backfill (
+               source TEXT PRIMARY KEY,
+               done_id INTEGER NOT NULL,
+               until_id INTEGER NOT NULL
+           ) WITHOUT ROWID""",
+        # rows up to until_id predate the triggers; same transaction, so none are missed or counted twice
+        "INSERT INTO rollup_backfill SELECT 'searches', 0, COALESCE(MAX(id), 0) FROM searches",
+        "INSERT INTO rollup_backfill SELECT 'logins', 0, COALESCE(MAX(id), 0) FROM logins",
+        """CREATE TRIGGER IF NOT EXISTS searches_rollup_insert AFTER INSERT ON searches BEGIN
+               INSERT INTO search_daily (day, category, intent, count)
+                   VALUES (substr(NEW.timestamp, 1, 10), COALESCE(NEW.category, ''), COALESCE(NEW.intent, ''), 1)
+                   ON CONFLICT(day, category, intent) DO UPDATE SET count = count + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS logins_rollup_insert AFTER INSERT ON logins BEGIN
+               INSERT INTO login_hourly (hour, count) VALUES (substr(NEW.login_time, 1, 13), 1)
+                   ON CONFLICT(hour) DO UPDATE SET count = count + 1;
+           END""",
+    ),
+    # 4: replies stored once in `replies`, referenced by searches.reply_id; `search_log` joins them back
+    (
+        """CREATE TABLE IF NOT EXISTS replies (
+               id INTEGER PRIMARY KEY,
+               text TEXT NOT NULL UNIQUE
+           )""",
+        "INSERT OR IGNORE INTO replies (text) SELECT DISTINCT reply FROM searches WHERE reply IS NOT NULL",
+        # rebuild rather than NULL out the column, so the old text does not linger in the table's pages
+        """CREATE TABLE searches_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               question TEXT,
+               reply_id INTEGER,
+               category TEXT,
+               intent TEXT,
+               timestamp TEXT,
+               FOREIGN KEY(user_id) REFERENCES users(id),
+               FOREIGN KEY(reply_id) REFERENCES replies(id)
+           )""",
+        """INSERT INTO searches_new (id, user_id, question, reply_id, category, intent, timestamp)
+               SELECT s.id, s.user_id, s.question, r.id, s.category, s.intent, s.timestamp
+               FROM searches s LEFT JOIN replies r ON r.text = s.reply""",
+        "DROP TABLE searches",
+        "ALTER TABLE searches_new RENAME TO searches",
+        "CREATE INDEX IF NOT EXISTS idx_searches_user_time ON searches(user_id, timestamp)",
+        """CREATE TRIGGER IF NOT EXISTS searches_rollup_insert AFTER INSERT ON searches BEGIN
+               INSERT INTO search_daily (day, category, intent, count)
+                   VALUES (substr(NEW.timestamp, 1, 10), COALESCE(NEW.category, ''), COALESCE(NEW.intent, ''), 1)
+                   ON CONFLICT(day, category, intent) DO UPDATE SET count = count + 1;
+           END""",
+        """CREATE VIEW IF NOT EXISTS search_log AS
+               SELECT s.id, s.user_id, s.question, r.text AS reply, s.category, s.intent, s.timestamp
+               FROM searches s LEFT JOIN replies r ON r.id = s.reply_id""",
+    ),
+]
+
+
+SCHEMA_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at TEXT NOT NULL
+)"""
+
+
+def schema_version(db):
+    """Latest migration applied to `db`; -1 for a new database."""
+    try:
+        version = db.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    except sqlite3.OperationalError:
+        # migrated before the table existed, when PRAGMA user_version kept the count
+        version = db.execute("PRAGMA user_version").fetchone()[0] or None
+    return -1 if version is None else version
+
+
+def migrate_db(db):
+    """Apply pending MIGRATIONS in order; returns the versions applied.
+
+    Each step runs in its own transaction. BEGIN IMMEDIATE takes the write
+    lock before the version is re-read, so concurrent runs apply every step
+    exactly once. An up-to-date database costs one read and no lock.
+    """
+    latest = len(MIGRATIONS) - 1
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_version'").fetchone():
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            legacy = schema_version(db)
+            db.execute(SCHEMA_VERSION_TABLE)
+            if legacy >= 0 and not db.execute("SELECT 1 FROM schema_version").fetchone():
+                db.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                           (legacy, datetime.utcnow().isoformat()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    if schema_version(db) >= latest:
+        return []
+    applied = []
+    for version, statements in enumerate(MIGRATIONS):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(db) >= version:
+                db.rollback()
+                continue
+            for statement in statements:
+                db.execute(statement)
+            db.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                       (version, datetime.utcnow().isoformat()))
+            db.commit()
+            applied.append(version)
+        except Exception:
+            db.rollback()
+            raise
+    return applied
+
+
+@bp.cli.command("migrate")
+@click.option("--status", is_flag=True, help="Only show the current and latest schema version.")
+def migrate_command(status):
+    """Apply pending schema migrations; run once per deploy, before starting workers."""
+    pool = app_state().pool
+    conn = pool.acquire()
+    try:
+        current = schema_version(conn)
+        print(f"schema version {current}, latest {len(MIGRATIONS) - 1}")
+        if not status:
+            applied = migrate_db(conn)
+            print(f"applied {', '.join(map(str, applied))}" if applied else "nothing to apply")
+    finally:
+        pool.release(conn)
+
+
+def email_domain(email):
+    return email.split("@", 1)[1] if "@" in email else ""
+
+
+# ---- Keyset pagination ----
+def encode_cursor(*values):
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    """Inverse of encode_cursor; returns None for a missing or malformed token."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    # only what encode_cursor writes (timestamps and ids); anything else can't be bound as a parameter
+    if not all(isinstance(v, (str, int)) and not isinstance(v, bool) for v in values):
+        return None
+    return values
+
+
+USER_LIST_COLUMNS = "id, name, email, phone, signup_date, last_login"
+
+
+def fetch_users_page(db, after=None, limit=USERS_PAGE_SIZE):
+    """One page of users ordered by (signup_date, id), starting after `after`.
+
+    Seeks straight to the cursor through idx_users_signup_date, so every
+    page costs the same no matter how deep it is. Returns (rows, next_after).
+    """
+    if after is None:
+        cur = db.execute(
+            f"SELECT {USER_LIST_COLUMNS} FROM users ORDER BY signup_date, id LIMIT ?",
+            (limit + 1,)
+        )
+    else:
+        cur = db.execute(
+            f"SELECT {USER_LIST_COLUMNS} FROM users WHERE (signup_date, id) > (?, ?) "
+            "ORDER BY signup_date, id LIMIT ?",
+            (after[0], after[1], limit + 1)
+        )
+    rows = cur.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]["signup_date"], rows[-1]["id"])
+    return rows, None
 
 
-def init_db():
-    """Create tables if they don't exist."""
-    db = get_db()
-    cur = db.cursor()
-    cur.executescript(
+def fetch_history_page(db, user_id, before=None, limit=CHAT_HISTORY_PAGE):
+    """A user's searches, newest first, strictly older than `before` (timestamp, id).
+
+    Served from idx_searches_user_time, whose entries end in the rowid, so
+    the seek costs the same however long the history is; each reply is
+    one primary-key lookup in `replies` through the search_log view.
+    Returns (rows, next_before).
+    """
+    if before is None:
+        cur = db.execute(
+            "SELECT id, question, reply, timestamp FROM search_log WHERE user_id = ? "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (user_id, limit + 1)
+        )
+    else:
+        cur = db.execute(
+            "SELECT id, question, reply, timestamp FROM search_log WHERE user_id = ? AND (timestamp, id) < (?, ?) "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (user_id, before[0], before[1], limit + 1)
+        )
+    rows = cur.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]["timestamp"], rows[-1]["id"])
+    return rows, None
+
+
+def iter_users(db, batch_size=EXPORT_BATCH_SIZE):
+    """Yield every user in (signup_date, id) order, one keyset batch at a time."""
+    after = None
+    while True:
+        rows, after = fetch_users_page(db, after, batch_size)
+        yield from rows
+        if after is None:
+            return
+
+
+# table or view, and the columns exported from it
+EXPORT_TABLES = {
+    "users": ("users", USER_LIST_COLUMNS),
+    "logins": ("logins", "id, user_id, login_time, logout_time, ip"),
+    "searches": ("search_log", "id, user_id, question, reply, category, intent, timestamp"),
+}
+
+
+def iter_table(db, name, batch_size=EXPORT_BATCH_SIZE):
+    """Yield every row of an EXPORT_TABLES entry in id order, one keyset batch at a time."""
+    source, columns = EXPORT_TABLES[name]
+    after = 0
+    while True:
+        rows = db.execute(f"SELECT {columns} FROM {source} WHERE id > ? ORDER BY id LIMIT ?",
+                          (after, batch_size)).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1]["id"]
+
+
+def encode_rows(rows, fields, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield CSV (with a header) or JSONL text for `rows`, `batch_size` rows per chunk."""
+    if fmt == "jsonl":
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+            if len(lines) == batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(tuple(row))
+        if i % batch_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+# ---- Analytics rollups ----
+# Same grouping as the triggers in migration 3, applied to a range of older rows.
+ROLLUP_BACKFILL_SQL = {
+    "searches": """INSERT INTO search_daily (day, category, intent, count)
+                       SELECT substr(timestamp, 1, 10), COALESCE(category, ''), COALESCE(intent, ''), COUNT(*)
+                       FROM searches WHERE id > ? AND id <= ? GROUP BY 1, 2, 3
+                   ON CONFLICT(day, category, intent) DO UPDATE SET count = count + excluded.count""",
+    "logins": """INSERT INTO login_hourly (hour, count)
+                     SELECT substr(login_time, 1, 13), COUNT(*)
+                     FROM logins WHERE id > ? AND id <= ? GROUP BY 1
+                 ON CONFLICT(hour) DO UPDATE SET count = count + excluded.count""",
+}
+
+
+def backfill_rollups(db, batch_size=ROLLUP_BACKFILL_BATCH):
+    """Fold rows written before the rollup triggers existed into the rollups.
+
+    Works through rowid ranges of `batch_size`, one short transaction each,
+    and stores the watermark with every range, so it can be stopped and
+    resumed and runs alongside live traffic. Yields (source, done, until).
+    """
+    for source, sql in ROLLUP_BACKFILL_SQL.items():
+        while True:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                done, until = db.execute("SELECT done_id, until_id FROM rollup_backfill WHERE source = ?",
+                                         (source,)).fetchone()
+                if done >= until:
+                    db.rollback()
+                    break
+                upto = min(done + batch_size, until)
+                db.execute(sql, (done, upto))
+                db.execute("UPDATE rollup_backfill SET done_id = ? WHERE source = ?", (upto, source))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            yield source, upto, until
+
+
+def rollup_backfill_status(db):
+    return {row["source"]: {"done_id": row["done_id"], "until_id": row["until_id"],
+                            "complete": row["done_id"] >= row["until_id"]}
+            for row in db.execute("SELECT source, done_id, until_id FROM rollup_backfill")}
+
+
+@bp.cli.command("backfill-rollups")
+@click.option("--batch-size", default=ROLLUP_BACKFILL_BATCH, show_default=True)
+def backfill_rollups_command(batch_size):
+    """Add searches and logins that predate the analytics rollups."""
+    pool = app_state().pool
+    conn = pool.acquire()
+    try:
+        start = time.perf_counter()
+        for source, done, until in backfill_rollups(conn, batch_size):
+            print(f"{source}: {done}/{until}")
+        print(f"rollups complete in {time.perf_counter() - start:.1f}s")
+    finally:
+        pool.release(conn)
+
+
+# ---- Archival ----
+ARCHIVE_COLUMNS = "id, user_id, question, reply, category, intent, timestamp"
+
+
+def archive_path(month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"searches-{month}.db")
+
+
+def open_archive(month, archive_dir=ARCHIVE_DIR):
+    """Connection to the archive for `month` (YYYY-MM), created on first use.
+
+    Archives are plain SQLite files with a `searches` table, so they can
+    be queried directly or ATTACHed to the main database.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(archive_path(month, archive_dir))
+    conn.execute("""CREATE TABLE IF NOT EXISTS searches (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER,
+                        question TEXT,
+                        reply TEXT,
+                        category TEXT,
+                        intent TEXT,
+                        timestamp TEXT
+                    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_user_time ON searches(user_id, timestamp)")
+    return conn
+
+
+def archive_searches(db, before, batch_size=ARCHIVE_BATCH, archive_dir=ARCHIVE_DIR):
+    """Move searches older than `before` (ISO timestamp) into monthly archives.
+
+    Archives keep the reply text (read through the search_log view), so
+    each file stands alone. Walks the table in id order, `batch_size`
+    rows at a time, so memory
+    stays flat however large it is. Each batch is committed to its
+    archive(s) before it is deleted here; the archive insert ignores ids
+    it already has, so a run interrupted between the two is safe to
+    repeat. The analytics rollups are left as they are. Yields
+    (rows moved, {month: rows}) per batch.
+    """
+    archives = {}
+    after = 0
+    try:
+        while True:
+            rows = db.execute(f"SELECT {ARCHIVE_COLUMNS} FROM search_log WHERE id > ? AND timestamp < ? "
+                              "ORDER BY id LIMIT ?", (after, before, batch_size)).fetchall()
+            if not rows:
+                return
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row["timestamp"][:7], []).append(tuple(row))
+            for month, chunk in by_month.items():
+                if month not in archives:
+                    archives[month] = open_archive(month, archive_dir)
+                with archives[month] as conn:
+                    conn.executemany("INSERT OR IGNORE INTO searches VALUES (?, ?, ?, ?, ?, ?, ?)", chunk)
+            last = rows[-1]["id"]
+            with db:
+                # same predicate as the SELECT, so exactly the rows just archived
+                db.execute("DELETE FROM searches WHERE id > ? AND id <= ? AND timestamp < ?", (after, last, before))
+            after = last
+            yield len(rows), {month: len(chunk) for month, chunk in by_month.items()}
+    finally:
+        for conn in archives.values():
+            conn.close()
+
+
+def incremental_vacuum(db, step_pages=VACUUM_STEP_PAGES, pause=0.05):
+    """Return free pages to the filesystem a step at a time, pausing between steps.
+
+    Each step holds the write lock only briefly, so it can run next to
+    live traffic. Needs auto_vacuum = INCREMENTAL; returns pages freed.
+    """
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    while True:
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        # executescript steps the pragma to completion; execute() would free a single page
+        db.executescript(f"PRAGMA incremental_vacuum({int(step_pages)})")
+        freed += min(free, step_pages)
+        time.sleep(pause)
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return freed
+
+
+def searches_table_stats(db):
+    """Size of the main database and timings of a table scan and a per-user history page."""
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    start = time.perf_counter()
+    db.execute("SELECT category, COUNT(*) FROM searches GROUP BY category").fetchall()  # reads every row
+    scan = time.perf_counter() - start
+    rows = db.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+    user = db.execute("SELECT user_id FROM searches ORDER BY id DESC LIMIT 1").fetchone()
+    start = time.perf_counter()
+    if user:
+        fetch_history_page(db, user[0])
+    history = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "db_bytes": db.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        "free_bytes": db.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        "scan_ms": scan * 1000,
+        "history_page_ms": history * 1000,
+    }
+
+
+@bp.cli.command("archive-searches")
+@click.option("--older-than-days", default=ARCHIVE_AFTER_DAYS, show_default=True)
+@click.option("--batch-size", default=ARCHIVE_BATCH, show_default=True)
+@click.option("--vacuum-step", default=VACUUM_STEP_PAGES, show_default=True, help="pages per incremental_vacuum")
+@click.option("--full-vacuum", is_flag=True,
+              help="switch an older database to incremental auto-vacuum (one blocking VACUUM)")
+def archive_searches_command(older_than_days, batch_size, vacuum_step, full_vacuum):
+    """Move old searches into archive/searches-YYYY-MM.db and shrink the main database."""
+    def show(label, s):
+        print(f"{label} {s['rows']} rows, {s['db_bytes'] / 1e6:.1f} MB ({s['free_bytes'] / 1e6:.1f} MB free), "
+              f"scan {s['scan_ms']:.1f} ms, history page {s['history_page_ms']:.2f} ms")
+
+    before = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    pool = app_state().pool
+    conn = pool.acquire()
+    try:
+        show("before:", searches_table_stats(conn))
+        moved, months = 0, {}
+        start = time.perf_counter()
+        for n, by_month in archive_searches(conn, before, batch_size):
+            moved += n
+            for month, count in by_month.items():
+                months[month] = months.get(month, 0) + count
+        print(f"archived {moved} rows older than {before[:10]} in {time.perf_counter() - start:.1f}s: "
+              + (", ".join(f"{m}={c}" for m, c in sorted(months.items())) or "nothing to do"))
+        if full_vacuum and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print(f"released {incremental_vacuum(conn, vacuum_step)} pages")
+        else:
+            print("auto_vacuum is not INCREMENTAL; freed pages are reused but the file does not shrink "
+                  "(run once with --full-vacuum)")
+        show("after: ", searches_table_stats(conn))
+    finally:
+        pool.release(conn)
+
+
+# -------------------- Sessions (server-side) --------------------
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict loaded from a store; `snapshot` is the data as loaded."""
+
+    def __init__(self, initial=None, sid=None, snapshot=None, expires=0.0):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.snapshot = snapshot
+        self.expires = expires
+        self.loaded_user = self.get("user_id")
+        self.modified = False
+
+
+class MemorySessionStore:
+    """Per-process LRU of sid -> (data, expires), bounded by `max_entries`."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry
+
+    def save(self, sid, data, expires):
+        with self._lock:
+            self._entries[sid] = (data, expires)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, sid, expires):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                self._entries[sid] = (entry[0], expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteSessionStore:
+    """Sessions table shared by every worker; expired rows are swept every `purge_interval`."""
+
+    def __init__(self, pool, purge_interval=SESSION_PURGE_INTERVAL):
+        self.pool = pool
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+
+    def _run(self, sql, params):
+        # the session is saved before teardown, while the request still holds its
+        # get_db() connection; waiting on a second one could exhaust the pool
+        conn = g.get("_database") if has_app_context() else None
+        if conn is not None:
+            with conn:
+                return conn.execute(sql, params).fetchone()
+        conn = self.pool.acquire()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchone()
+        finally:
+            self.pool.release(conn)
+
+    def load(self, sid):
+        row = self._run("SELECT data, expires FROM sessions WHERE id = ? AND expires > ?", (sid, time.time()))
+        return (row["data"], row["expires"]) if row else None
+
+    def save(self, sid, data, expires):
+        self._run("""INSERT INTO sessions (id, data, expires) VALUES (?, ?, ?)
+                     ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires = excluded.expires""",
+                  (sid, data, expires))
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self._run("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+    def touch(self, sid, expires):
+        self._run("UPDATE sessions SET expires = ? WHERE id = ?", (expires, sid))
+
+    def delete(self, sid):
+        self._run("DELETE FROM sessions WHERE id = ?", (sid,))
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps session data in `store` and only a random session id in the cookie.
+
+    Writes are coalesced: a session is saved only when its serialized data
+    differs from what was loaded (assigning an unchanged value costs
+    nothing), and its expiry is bumped at most every `touch_interval`
+    seconds. The cookie is sent once, when the id is issued. A new id is
+    issued whenever the logged-in user changes, so an id handed out before
+    login cannot be reused after it.
+    """
+
+    def __init__(self, store, ttl=SESSION_TTL, touch_interval=SESSION_TOUCH_INTERVAL):
+        self.store = store
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+
+    @staticmethod
+    def _dumps(session):
+        return json.dumps(dict(session), sort_keys=True, separators=(",", ":"))
+
+    def _op(self, op):
+        metrics.inc("session_store_ops_total", (("op", op),))
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            self._op("load")
+            entry = self.store.load(sid)
+            if entry is not None:
+                data, expires = entry
+                return ServerSession(json.loads(data), sid, data, expires)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        if session.sid is not None:
+            response.vary.add("Cookie")
+        if not session:
+            if session.sid is not None:
+                self._op("delete")
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        data = self._dumps(session)
+        now = time.time()
+        expires = now + self.ttl
+        if session.sid is None or session.get("user_id") != session.loaded_user:
+            if session.sid is not None:
+                self._op("delete")
+                self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            self._op("save")
+            self.store.save(session.sid, data, expires)
+            response.vary.add("Cookie")
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+        elif data != session.snapshot:
+            self._op("save")
+            self.store.save(session.sid, data, expires)
+        elif expires - session.expires >= self.touch_interval:
+            self._op("touch")
+            self.store.touch(session.sid, expires)
+
+
+def make_session_store(backend, pool):
+    """Session store for SESSION_BACKEND `backend`; None for "cookie"."""
+    if backend == "cookie":
+        return None
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SqliteSessionStore(pool)
+    raise ValueError(f"unknown SESSION_BACKEND {backend!r} (memory, sqlite or cookie)")
+
+
+# -------------------- Search log (write-behind) --------------------
+INSERT_SEARCH_SQL = (
+    "INSERT INTO searches (user_id, question, reply_id, category, intent, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+)
+REPLY_IDS_MAX = 10_000  # cached reply text -> id mappings per process
+
+
+class ReplyInterner:
+    """Maps reply text to its row in `replies`, inserting new texts once.
+
+    There are only a few dozen distinct replies, so after warm-up every
+    lookup is a dict hit. New texts are committed before the rows that
+    use them, so a cached id never points at a rolled-back insert.
+    """
+
+    def __init__(self, max_entries=REPLY_IDS_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def rows(self, conn, rows):
+        """(user_id, question, reply, category, intent, timestamp) rows with the reply swapped for its id."""
+        with self._lock:
+            ids = self._ids
+            # resolve the whole batch before evicting, so an eviction can't drop a text it still needs
+            batch = {row[2]: ids.get(row[2]) for row in rows if row[2] is not None}
+            missing = [text for text, reply_id in batch.items() if reply_id is None]
+            if missing:
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO replies (text) VALUES (?)", [(t,) for t in missing])
+                for text in missing:
+                    batch[text] = conn.execute("SELECT id FROM replies WHERE text = ?", (text,)).fetchone()[0]
+                if len(ids) + len(missing) > self.max_entries:
+                    ids.clear()
+                ids.update((text, batch[text]) for text in missing)
+            return [(r[0], r[1], None if r[2] is None else batch[r[2]], r[3], r[4], r[5]) for r in rows]
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+class SearchLogWriter:
+    """Buffers search rows and writes them in batches from a background thread.
+
+    A batch is flushed with one executemany + commit when it reaches
+    `batch_size` rows or its oldest row is `interval` seconds old. The queue
+    is bounded: when it is full, `log()` blocks for up to `put_timeout` and
+    then writes the row itself from the request thread, so a slow disk
+    pushes back on callers instead of growing memory or dropping rows.
+    """
+
+    _STOP = object()
+
+    def __init__(self, pool, sync=not SEARCH_LOG_ASYNC, batch_size=SEARCH_LOG_BATCH,
+                 interval=SEARCH_LOG_INTERVAL, maxsize=SEARCH_LOG_QUEUE,
+                 put_timeout=SEARCH_LOG_PUT_TIMEOUT):
+        self.pool = pool
+        self.reply_ids = ReplyInterner()  # ids are only valid for this pool's database
+        self.sync = sync
+        self.batch_size = batch_size
+        self.interval = interval
+        self.put_timeout = put_timeout
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "inline": 0, "failed": 0}
+
+    def _ensure_started(self):
+        # threads do not survive fork(), so each worker process starts its own
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self._maxsize)
+            self._thread = threading.Thread(target=self._run, name="search-log", daemon=True)
+            self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def log(self, row):
+        """Record one (user_id, question, reply, category, intent, timestamp) row."""
+        if self.sync:
+            self._write_inline([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            self._count("enqueued")
+        except queue.Full:
+            self._count("inline")
+            self._write_inline([row])
+
+    def log_many(self, rows):
+        """Write rows now, in one transaction (batch chat API)."""
+        self._write_inline(rows)
+
+    def _write_inline(self, rows):
+        conn = self.pool.acquire()
+        try:
+            rows = self.reply_ids.rows(conn, rows)
+            with conn:
+                conn.executemany(INSERT_SEARCH_SQL, rows)
+        finally:
+            self.pool.release(conn)
+        self._count("written", len(rows))
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            if first is self._STOP:
+                self._queue.task_done()
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+        # drain whatever arrived before the stop marker
+        rest = []
+        while True:
+            try:
+                rest.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        rest = [row for row in rest if row is not self._STOP]
+        for i in range(0, len(rest), self.batch_size):
+            self._write_batch(rest[i:i + self.batch_size])
+
+    def _write_batch(self, batch):
+        try:
+            conn = self.pool.acquire()
+            try:
+                rows = self.reply_ids.rows(conn, batch)
+                with conn:
+                    conn.executemany(INSERT_SEARCH_SQL, rows)
+            finally:
+                self.pool.release(conn)
+            self._count("written", len(batch))
+            self._count("batches")
+        except Exception:
+            self._count("failed", len(batch))
+            logger.exception("search log: dropped batch of %d rows", len(batch))
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Write out the queue and stop the background thread."""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join()
+
+
+# -------------------- Password hashing --------------------
+class HashPoolBusy(Exception):
+    """Too many password hashes are already queued; the caller should answer 503."""
+
+
+class PasswordHasher:
+    """Runs werkzeug's password hashing in a bounded pool of worker processes.
+
+    At most `max_pending` hashes are queued or running per process; beyond
+    that calls fail fast with HashPoolBusy instead of tying up more request
+    threads. With offload=False hashing runs inline, as it used to.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, offload=PASSWORD_HASH_OFFLOAD,
+                 workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING):
+        self.method = method
+        self.offload = offload
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+                import multiprocessing  # only workers that hash passwords pay for these imports
+                from concurrent.futures import ProcessPoolExecutor
+                # forkserver: never fork() the (multi-threaded) server process itself
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver"))
+            return self._pool, self._slots
+
+    def _run(self, fn, *args, **kwargs):
+        if not self.offload:
+            return fn(*args, **kwargs)
+        pool, slots = self._executor()
+        if not slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            return pool.submit(fn, *args, **kwargs).result()
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords, chunksize=16):
+        """Hash a list of passwords across all workers (bulk import); not bounded by max_pending."""
+        hash_one = functools.partial(generate_password_hash, method=self.method)
+        if not self.offload:
+            return [hash_one(p) for p in passwords]
+        pool, _ = self._executor()
+        return list(pool.map(hash_one, passwords, chunksize=chunksize))
+
+    @functools.cached_property
+    def method_prefix(self):
+        """The "method:params" prefix werkzeug stores for `method`, with its defaults filled in.
+
+        Shorthands expand ("scrypt" is stored as "scrypt:32768:8:1"). Worked
+        out from the method string the same way werkzeug does, so checking a
+        login never costs an extra hash on the request thread.
         """
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT UNIQUE,
-        phone TEXT,
-        password_hash TEXT,
-        signup_date TEXT,
-        last_login TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS logins (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        login_time TEXT,
-        logout_time TEXT,
-        ip TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    );
-
-    CREATE TABLE IF NOT EXISTS searches (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        question TEXT,
-        reply TEXT,
-        category TEXT,
-        timestamp TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    );
+        name, *args = self.method.split(":")
+        if name == "scrypt":
+            n, r, p = map(int, args) if args else (2**15, 8, 1)
+            return f"scrypt:{n}:{r}:{p}"
+        if name == "pbkdf2" and len(args) <= 2:
+            hash_name = args[0] if args else "sha256"
+            iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+            return f"pbkdf2:{hash_name}:{iterations}"
+        raise ValueError(f"Invalid hash method '{self.method}'.")
+
+    def needs_rehash(self, pwhash):
+        """True if the stored hash was made with a different method or cost."""
+        return pwhash.split("$", 1)[0] != self.method_prefix
+
+    def close(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.close)
+
+BUSY_HEADERS = {"Retry-After": "1"}
+BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment."
+
+
+# ---- Bulk import / export (district onboarding) ----
+def open_data_file(path, mode="r"):
+    """Text file for CSV/JSONL, or stdin/stdout for "-"."""
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def read_user_records(f, fmt):
+    """Yield dicts from a CSV (with a header row) or JSONL file."""
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(f)
+
+
+def import_users(db, records, batch_size=IMPORT_BATCH_SIZE, hasher=None):
+    """Insert user records (name, email, phone and password or password_hash) in batches.
+
+    Per batch: duplicates within the batch are dropped, emails already
+    registered are found with one query, new passwords are hashed in
+    parallel, and the rest go in with one executemany and one commit.
+    ON CONFLICT covers a signup that lands between the check and the
+    insert. Yields a stats dict after each batch.
     """
-    )
-    db.commit()
+    hasher = hasher or password_hasher
+    records = iter(records)
+    stats = {"read": 0, "inserted": 0, "existing": 0, "duplicate": 0, "invalid": 0, "hash_seconds": 0.0}
+    while True:
+        batch = [r for _, r in zip(range(batch_size), records)]
+        if not batch:
+            return
+        stats["read"] += len(batch)
+        fresh = {}
+        for r in batch:
+            email = (r.get("email") or "").strip().lower()
+            if not (r.get("name") and email and r.get("phone") and (r.get("password") or r.get("password_hash"))):
+                stats["invalid"] += 1
+            elif email in fresh:
+                stats["duplicate"] += 1
+            else:
+                fresh[email] = r
+        existing = {row[0] for row in db.execute(
+            "SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))", (json.dumps(list(fresh)),))}
+        stats["existing"] += len(existing)
+        todo = [(email, r) for email, r in fresh.items() if email not in existing]
 
+        start = time.perf_counter()
+        plain = [r["password"] for _, r in todo if not r.get("password_hash")]
+        hashes = iter(hasher.hash_many(plain))
+        stats["hash_seconds"] += time.perf_counter() - start
 
-# Create DB on startup
-with app.app_context():
-    init_db()
+        now = datetime.utcnow().isoformat()
+        rows = [(r["name"], email, email_domain(email), r["phone"], r.get("password_hash") or next(hashes),
+                 r.get("signup_date") or now) for email, r in todo]
+        with db:
+            inserted = db.executemany("INSERT INTO users (name, email, email_domain, phone, password_hash, signup_date) "
+                                      "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(email) DO NOTHING", rows).rowcount
+        stats["inserted"] += inserted
+        stats["existing"] += len(rows) - inserted
+        yield stats
+
+
+@bp.cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="default: from the file extension")
+@click.option("--batch-size", default=IMPORT_BATCH_SIZE, show_default=True)
+def import_users_command(path, fmt, batch_size):
+    """Load users from a CSV or JSONL file (name, email, phone, password or password_hash)."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    pool = app_state().pool
+    conn = pool.acquire()
+    start = time.perf_counter()
+    stats = None
+    try:
+        with open_data_file(path) as f:
+            for stats in import_users(conn, read_user_records(f, fmt), batch_size):
+                elapsed = time.perf_counter() - start
+                print(f"{stats['read']} read, {stats['inserted']} inserted ({stats['read'] / elapsed:.0f} rows/s)",
+                      file=sys.stderr)
+    finally:
+        pool.release(conn)
+    if stats:
+        elapsed = time.perf_counter() - start
+        print(f"done in {elapsed:.1f}s: {stats['inserted']} inserted, {stats['existing']} already registered, "
+              f"{stats['duplicate']} repeated in the file, {stats['invalid']} invalid; "
+              f"{stats['read'] / elapsed:.0f} rows/s ({stats['hash_seconds']:.1f}s hashing)")
+
+
+@bp.cli.command("export-data")
+@click.argument("table", type=click.Choice(sorted(EXPORT_TABLES)))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+@click.option("--output", "-o", default="-", type=click.Path(dir_okay=False, allow_dash=True))
+def export_data_command(table, fmt, output):
+    """Stream users, logins or searches to a CSV or JSONL file (stdout by default)."""
+    fields = [c.strip() for c in EXPORT_TABLES[table][1].split(",")]
+    pool = app_state().pool
+    conn = pool.acquire()
+    start = time.perf_counter()
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for row in iter_table(conn, table):
+            rows += 1
+            yield row
+
+    try:
+        with open_data_file(output, "w") as f:
+            for chunk in encode_rows(counted(), fields, fmt):
+                f.write(chunk)
+    finally:
+        pool.release(conn)
+    elapsed = time.perf_counter() - start
+    print(f"exported {rows} {table} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
 
 
 # -------------------- Your original data (unchanged) --------------------
@@ -98,130 +1629,79 @@ texts = {
 }
 
 # ---- Schemes DB (master) and alerts per category ----
-schemes_db = {
-    "student": {
-        "schemes": [
-            "Jagananna Vidya Deevena – 100% fee reimbursement",
-            "Vasathi Deevena – hostel & food support",
-            "Post-Matric Scholarship",
-            "National Scholarship Portal (NSP)"
-        ],
-        "amount": "₹10,000 – ₹20,000 yearly depending on the course.",
-        "apply": "Apply via Jnanabhumi or NSP portals.",
-        "date": "June – October every year.",
-        "alerts": [
-            "🎓 NSP verification window opens on 1 Aug.",
-            "⚠️ Last date for some scholarship verification: 30 Sep."
-        ]
-    },
-    "farmer": {
-        "schemes": [
-            "PM Kisan – ₹6,000 yearly",
-            "Rythu Bharosa",
-            "PM Fasal Bima Yojana",
-            "Soil Health Card"
-        ],
-        "amount": "PM Kisan gives ₹6,000 per year. Other schemes vary.",
-        "apply": "Apply at Rythu Bharosa center or online.",
-        "date": "PM Kisan renewal is continuous; insurance deadlines vary.",
-        "alerts": [
-            "⚠️ Last date to apply for PM-Kisan 16th installment: 30 Nov.",
-            "🌾 Rythu Bharosa new enrollment starts 5 Dec at district centers."
-        ]
-    },
-    # Add other categories similarly...
-    "women": {
-        "schemes": [
-            "YSR Cheyutha – financial support",
-            "Mahila Samakhya",
-            "Stand-Up India Loans",
-            "Women SHG Loans"
-        ],
-        "amount": "₹75,000 over 4 years in some programs.",
-        "apply": "Apply via ward/village secretariat.",
-        "date": "Active year-round.",
-        "alerts": [
-            "📢 Women SHG bank linkage drives next week.",
-        ]
-    },
-    "senior citizen": {
-        "schemes": ["Old Age Pension", "Senior Citizen Health Insurance", "Free Bus Pass"],
-        "amount": "₹2,000 monthly pension (varies by scheme).",
-        "apply": "Apply via MeeSeva or Navasakam.",
-        "date": "Monthly pension cycles.",
-        "alerts": ["🕘 Pension disbursement for this month scheduled on 1st."]
-    },
-    "job seeker": {
-        "schemes": ["YSR Unemployment Allowance", "Skill Development Training", "PM Kaushal Vikas Yojana"],
-        "amount": "₹1,000 – ₹3,000 monthly for some allowances.",
-        "apply": "Apply via Skill Development portal.",
-        "date": "Batches start every few months.",
-        "alerts": ["📢 New skill training batch opening next month."]
-    },
-    "entrepreneur": {
-        "schemes": ["PMEGP loan", "Mudra Loan", "Stand-Up India", "Startup India Seed Fund"],
-        "amount": "Subsidies vary; loans up to several lakhs.",
-        "apply": "Apply on respective portals.",
-        "date": "Ongoing.",
-        "alerts": ["🚀 Startup seed fund applications: rolling basis."]
-    },
-    "healthcare": {
-        "schemes": ["Aarogyasri", "Free Medicine Scheme", "Ayushman Bharat"],
-        "amount": "Coverage up to ₹5 lakh for eligible families.",
-        "apply": "Apply via health department portals.",
-        "date": "Available year-round.",
-        "alerts": ["🏥 Free medical camp in your district on 12 Dec."]
-    },
-    "housing": {
-        "schemes": ["PM Awas Yojana", "YSR Housing", "Urban Housing Subsidy"],
-        "amount": "Subsidies up to ₹2.5 lakhs (scheme dependent).",
-        "apply": "Apply via housing portal or local secretariat.",
-        "date": "Allotments annually.",
-        "alerts": ["🏠 New housing allotment list to be released next month."]
-    },
-    "loan finance": {
-        "schemes": ["Mudra Loan", "PM Jan Dhan", "MSME Support"],
-        "amount": "Loans from ₹10,000 to ₹10 lakhs.",
-        "apply": "Apply at bank or online.",
-        "date": "Monthly approvals.",
-        "alerts": ["🏦 Special MSME refinance window open this quarter."]
-    },
-    "shg": {
-        "schemes": ["SHG Bank Linkage", "Interest Free Loans", "Livelihood Support"],
-        "amount": "₹10,000 – ₹3,00,000 depending on program.",
-        "apply": "Apply via SERP/DRDA.",
-        "date": "Periodic disbursal.",
-        "alerts": ["👥 SHG bank linkage meeting next week."]
-    },
-    "minority": {
-        "schemes": ["Minority Scholarship", "Skill Training", "Housing Support"],
-        "amount": "₹5,000 – ₹25,000 scholarship ranges.",
-        "apply": "Apply via Minority Welfare portal.",
-        "date": "Scholarship cycle July – Dec.",
-        "alerts": ["🕌 Minority scholarship application opens 1 July."]
-    },
-    "youth": {
-        "schemes": ["Skill India Training", "Youth Empowerment Program", "YSR Job Mela"],
-        "amount": "Training often free; some include stipends.",
-        "apply": "Apply on Skill India portal.",
-        "date": "Monthly batches.",
-        "alerts": ["🎯 Youth job mela scheduled on 20th this month."]
-    },
-    "disability": {
-        "schemes": ["Disability Pension", "Assistive Devices Scheme", "Free Health Support"],
-        "amount": "₹3,000 monthly (varies).",
-        "apply": "Apply via MeeSeva/Navasakam.",
-        "date": "Monthly approvals.",
-        "alerts": ["♿ New assistive devices distribution on 10th Dec."]
-    },
-    "ration welfare": {
-        "schemes": ["Ration Card Subsidy", "Free Rice", "Annapurna Scheme"],
-        "amount": "Rice at subsidized rates (e.g., ₹1/kg for eligible families).",
-        "apply": "Apply at MeeSeva or Ration Office.",
-        "date": "Monthly distribution.",
-        "alerts": ["🍚 Ration distribution day announced for district X."]
-    }
-}
+# The catalog lives in schemes.json and is the single source for both the
+# chatbot replies and the chat page (served by /schemes.json).
+class SchemeCatalog:
+    """schemes.json loaded into memory, reloaded when the file changes.
+
+    `schemes_db` keeps the shape the routes use ({category: {"schemes":
+    [label, ...], "amount", "apply", "date", "alerts"}}); `by_name` indexes
+    every scheme by lower-cased name; `body`/`gzip_body`/`etag` are the
+    pre-serialized JSON response. `categories` is the raw per-scheme data.
+    """
+
+    def __init__(self, path, check_interval=CATALOG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.load()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def load(self):
+        stamp = self._stat()
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+
+        schemes_db, by_name = {}, {}
+        for cat, d in data["categories"].items():
+            schemes_db[cat] = {
+                "schemes": [s.get("summary") or s["name"] for s in d.get("schemes", [])],
+                "amount": d.get("amount", ""),
+                "apply": d.get("apply", ""),
+                "date": d.get("date", ""),
+                "alerts": d.get("alerts", []),
+            }
+            for s in d.get("schemes", []):
+                by_name[s["name"].lower()] = (cat, s)
+
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.version = data.get("version", 0)
+        self.categories = data["categories"]
+        self.schemes_db = schemes_db
+        self.by_name = by_name
+        self.body = body
+        self.gzip_body = gzip.compress(body, mtime=0)
+        self.etag = f"v{self.version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        self.last_modified = datetime.utcfromtimestamp(stamp[0] / 1e9)
+        self._stamp = stamp
+
+    def reload_if_changed(self):
+        """Reload if the file changed (checked at most every check_interval s)."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            try:
+                if self._stat() == self._stamp:
+                    return False
+                self.load()
+            except (OSError, ValueError, KeyError):
+                # keep serving the last good catalog while the file is being edited
+                logger.exception("scheme catalog: reload of %s failed", self.path)
+                return False
+        return True
+
+
+scheme_catalog = SchemeCatalog(SCHEMES_PATH)
+schemes_db = scheme_catalog.schemes_db
 
 # ---- Category mapping helper for detection ----
 category_aliases = {
@@ -242,36 +1722,806 @@ category_aliases = {
 }
 
 
+# Telugu / Hindi aliases. Indic words take case endings (రైతులకు, किसानों),
+# so these match as word prefixes rather than whole words.
+category_aliases_local = {
+    "student": ["విద్యార్థి", "ఉపకార వేతనం", "छात्र", "छात्रवृत्ति", "विद्यार्थी"],
+    "farmer": ["రైతు", "వ్యవసాయ", "किसान", "कृषि"],
+    "women": ["మహిళ", "స్త్రీ", "महिला"],
+    "senior citizen": ["వృద్ధ", "పింఛను", "పెన్షన్", "वरिष्ठ", "बुजुर्ग", "पेंशन"],
+    "job seeker": ["ఉద్యోగ", "नौकरी", "बेरोजगार", "रोजगार", "रोज़गार"],
+    "entrepreneur": ["వ్యాపార", "उद्यमी", "व्यवसाय", "व्यापार"],
+    "healthcare": ["ఆరోగ్య", "ఆసుపత్రి", "स्वास्थ्य", "अस्पताल"],
+    "housing": ["ఇల్లు", "గృహ", "आवास", "मकान"],
+    "loan finance": ["రుణ", "ऋण", "लोन"],
+    "shg": ["స్వయం సహాయక", "स्वयं सहायता"],
+    "minority": ["మైనారిటీ", "अल्पसंख्यक"],
+    "youth": ["యువత", "యువ", "युवा"],
+    "disability": ["వికలాంగ", "దివ్యాంగ", "विकलांग", "दिव्यांग"],
+    "ration welfare": ["రేషన్", "राशन"]
+}
+
+# ---- Follow-up intents (asked after a category) ----
+intent_keywords = {
+    "amount": ["amount", "how much", "ఎంత", "మొత్తం", "कितना", "कितनी", "राशि"],
+    "apply": ["apply", "how to apply", "దరఖాస్తు", "आवेदन"],
+    "date": ["date", "last date", "deadline", "తేదీ", "గడువు", "तारीख", "तिथि", "अंतिम तिथि"]
+}
+
+# Letters plus Devanagari/Telugu vowel signs, which str.isalnum() (and so \w) rejects.
+_WORD_CHAR = r"[^\W_]|[\u0900-\u097F\u0C00-\u0C7F]"
+
+
+def _trie_pattern(aliases):
+    """Regex alternation for the aliases, factored into a character trie.
+
+    Python's re tries alternatives one by one, so a flat "a|b|c|..." costs
+    O(aliases) at every position; the trie form branches on the next char.
+    """
+    trie = {}
+    for alias in aliases:
+        node = trie
+        for ch in alias:
+            node = node.setdefault(r"\s+" if ch == " " else re.escape(ch), {})
+        node[""] = {}
+
+    def emit(node):
+        end = "" in node
+        alts = [unit + emit(child) for unit, child in sorted(node.items()) if unit]
+        if not alts:
+            return ""
+        if len(alts) == 1 and not end:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")" + ("?" if end else "")
+
+    return emit(trie)
+
+
+def build_keyword_matcher(groups):
+    """Compile {kind: {key: [aliases]}} into one regex plus an alias lookup.
+
+    Latin aliases match whole words (with an optional plural "s"/"es"), Indic
+    aliases match at a word start. Matching is greedy, so "senior citizen"
+    wins over "senior".
+    """
+    lookup = {}
+    for kind, table in groups.items():
+        for key, aliases in table.items():
+            for alias in aliases:
+                lookup.setdefault(" ".join(alias.lower().split()), (kind, key))
+
+    latin = [a for a in lookup if a.isascii()]
+    local = [a for a in lookup if not a.isascii()]
+    pattern = (
+        rf"(?<!{_WORD_CHAR})(?:"
+        rf"({_trie_pattern(latin)})(?:e?s)?(?!{_WORD_CHAR})"
+        rf"|({_trie_pattern(local)}))"
+    )
+    return re.compile(pattern), lookup
+
+
+_keyword_re, _keyword_lookup = build_keyword_matcher({
+    "category": {
+        cat: category_aliases[cat] + category_aliases_local.get(cat, [])
+        for cat in category_aliases
+    },
+    "intent": intent_keywords,
+})
+
+
+def match_text(text):
+    """Find every category and intent in one pass over the text.
+
+    Returns {"category": [...], "intent": [...]}, each ranked by number of
+    hits, then by earliest position.
+    """
+    hits = {"category": {}, "intent": {}}
+    for latin, local in _keyword_re.findall(text.lower()):
+        alias = latin or local
+        hit = _keyword_lookup.get(alias) or _keyword_lookup[" ".join(alias.split())]
+        found = hits[hit[0]]
+        found[hit[1]] = found.get(hit[1], 0) + 1
+    # dicts keep first-seen order and sorted() is stable, so ties stay positional
+    return {kind: sorted(found, key=found.get, reverse=True) for kind, found in hits.items()}
+
+
 def detect_category_from_text(text):
-    t = text.lower()
-    for cat, keys in category_aliases.items():
-        for k in keys:
-            if k in t:
-                return cat
+    ranked = match_text(text)["category"]
+    return ranked[0] if ranked else None
+
+
+# -------------------- Chatbot replies --------------------
+# Fixed reply text per language; scheme details themselves come from schemes_db.
+reply_texts = {
+    "schemes_header": {"en": "Here are schemes for *{category}*:",
+                       "te": "*{category}* కోసం పథకాలు:",
+                       "hi": "*{category}* के लिए योजनाएँ:"},
+    "amount_missing": {"en": "Amount details not available.",
+                       "te": "మొత్తం వివరాలు అందుబాటులో లేవు.",
+                       "hi": "राशि की जानकारी उपलब्ध नहीं है।"},
+    "apply_missing": {"en": "Apply details not available.",
+                      "te": "దరఖాస్తు వివరాలు అందుబాటులో లేవు.",
+                      "hi": "आवेदन की जानकारी उपलब्ध नहीं है।"},
+    "date_missing": {"en": "Date information not available.",
+                     "te": "తేదీ వివరాలు అందుబాటులో లేవు.",
+                     "hi": "तारीख की जानकारी उपलब्ध नहीं है।"},
+    "amount_no_category": {"en": "Please ask about a category first (e.g., 'student schemes').",
+                           "te": "దయచేసి ముందుగా ఒక వర్గం గురించి అడగండి (ఉదా., 'student schemes').",
+                           "hi": "कृपया पहले किसी श्रेणी के बारे में पूछें (जैसे, 'student schemes')।"},
+    "apply_no_category": {"en": "Please specify which category you mean (student, farmer, etc.).",
+                          "te": "దయచేసి మీరు ఏ వర్గం గురించి అడుగుతున్నారో చెప్పండి (student, farmer, మొదలైనవి).",
+                          "hi": "कृपया बताएं कि आप किस श्रेणी की बात कर रहे हैं (student, farmer, आदि)।"},
+    "date_no_category": {"en": "Please specify which scheme or category you mean.",
+                         "te": "దయచేసి మీరు ఏ పథకం లేదా వర్గం గురించి అడుగుతున్నారో చెప్పండి.",
+                         "hi": "कृपया बताएं कि आप किस योजना या श्रेणी की बात कर रहे हैं।"},
+    "scheme_matches": {"en": "Here is what I found:",
+                       "te": "నాకు దొరికినవి:",
+                       "hi": "मुझे यह मिला:"},
+    "scheme_line": {"en": "• {name} ({category}) — Amount: {amount}, Apply: {apply}, Date: {date}",
+                    "te": "• {name} ({category}) — మొత్తం: {amount}, దరఖాస్తు: {apply}, తేదీ: {date}",
+                    "hi": "• {name} ({category}) — राशि: {amount}, आवेदन: {apply}, तारीख: {date}"},
+    "fallback": {"en": ("Sorry, I didn't understand that. Try asking like:\n"
+                        "'Tell me student schemes' or 'How to apply for PM Kisan' or 'Amount for student scholarships'."),
+                 "te": ("క్షమించండి, నాకు అర్థం కాలేదు. ఇలా అడగండి:\n"
+                        "'Tell me student schemes' లేదా 'How to apply for PM Kisan' లేదా 'Amount for student scholarships'."),
+                 "hi": ("क्षमा करें, मैं समझ नहीं पाया। ऐसे पूछें:\n"
+                        "'Tell me student schemes' या 'How to apply for PM Kisan' या 'Amount for student scholarships'.")}
+}
+
+REPLY_LANGS = ("en", "te", "hi")
+REPLY_CACHE_SIZE = 4096
+
+
+def build_reply_table(schemes):
+    """Every possible reply, keyed by (lang, category, intent).
+
+    (lang, cat, None) is the scheme list, (lang, cat, intent) a follow-up
+    answer, (lang, None, intent) the "which category?" prompt and
+    (lang, None, None) the fallback.
+    """
+    table = {}
+    for lang in REPLY_LANGS:
+        for cat, d in schemes.items():
+            header = reply_texts["schemes_header"][lang].format(category=cat)
+            table[(lang, cat, None)] = header + "\n• " + "\n• ".join(d.get("schemes", []))
+            for intent in intent_keywords:
+                table[(lang, cat, intent)] = d.get(intent, reply_texts[f"{intent}_missing"][lang])
+        for intent in intent_keywords:
+            table[(lang, None, intent)] = reply_texts[f"{intent}_no_category"][lang]
+        table[(lang, None, None)] = reply_texts["fallback"][lang]
+    return table
+
+
+reply_table = build_reply_table(schemes_db)
+
+
+def normalize_message(text):
+    return " ".join(text.lower().split())
+
+
+@functools.lru_cache(maxsize=REPLY_CACHE_SIZE)
+def classify_message(normalized):
+    """(top category, top intent) for a normalize_message() string; memoised."""
+    matches = match_text(normalized)
+    return (matches["category"][0] if matches["category"] else None,
+            matches["intent"][0] if matches["intent"] else None)
+
+
+def lookup_reply(lang, category, intent, last_category=None):
+    if lang not in REPLY_LANGS:
+        lang = "en"
+    if category:
+        return reply_table[(lang, category, None)]
+    if intent and last_category in schemes_db:
+        return reply_table[(lang, last_category, intent)]
+    return reply_table[(lang, None, intent)]
+
+
+def refresh_replies():
+    """Rebuild the reply table after schemes_db (or reply_texts) changes."""
+    global reply_table
+    reply_table = build_reply_table(schemes_db)
+    classify_message.cache_clear()
+
+
+@bp.before_app_request
+def reload_scheme_catalog():
+    global schemes_db
+    if scheme_catalog.reload_if_changed():
+        schemes_db = scheme_catalog.schemes_db
+        refresh_replies()
+        scheme_search.sync(scheme_catalog.categories)
+        alert_hub.sync(schemes_db)
+
+
+# ---- Scheme-level search (SQLite FTS5) ----
+SCHEME_SEARCH_LIMIT = 3
+SCHEME_SEARCH_MIN_RELATIVE = 0.7  # drop hits scoring below this fraction of the best one
+# words that say nothing about which scheme is meant
+SEARCH_STOPWORDS = frozenset(
+    "a an and the for of to in on at it is are be me my i we our what which who when where how much many "
+    "tell about please scheme schemes yojana give show list details detail info information can could you "
+    "do does get need want last date dates deadline amount apply application this that these those one help "
+    "online".split()
+)
+_SEARCH_TOKEN_RE = re.compile(rf"(?:{_WORD_CHAR})+")
+
+
+class SchemeSearch:
+    """FTS5 index over the names of every scheme in the catalog, BM25-ranked.
+
+    Lives in a process-local in-memory database; sync() diffs the catalog
+    against what is indexed and only rewrites schemes that changed. Only
+    the name is searched: words that also appear in how-to-apply text or
+    category aliases ("online", "self help") would otherwise turn ordinary
+    follow-ups into scheme lookups. The other columns are stored, not indexed.
+    """
+
+    COLUMNS = ("name", "category", "amount", "apply", "date")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE scheme_fts USING fts5(name, category UNINDEXED, amount UNINDEXED, "
+            "apply UNINDEXED, date UNINDEXED, "
+            "tokenize = \"unicode61 remove_diacritics 2 categories 'L* N* Co M*'\")"
+        )
+        self._sql = (
+            "SELECT name, category, amount, apply, date, bm25(scheme_fts) AS score "
+            "FROM scheme_fts WHERE scheme_fts MATCH ? ORDER BY score LIMIT ?"
+        )
+        self._rows = {}  # (category, name) -> (rowid, indexed values)
+        self._next_rowid = 1
+
+    def sync(self, categories):
+        """Index the catalog's schemes incrementally; returns (schemes written, schemes removed)."""
+        wanted = {}
+        for cat, d in categories.items():
+            for s in d.get("schemes", []):
+                wanted[(cat, s["name"])] = (s["name"], cat, s.get("amount", ""), s.get("apply", ""),
+                                            s.get("date", ""))
+        with self._lock, self._conn:
+            stale = [key for key, (_, values) in self._rows.items() if wanted.get(key) != values]
+            # changed schemes are deleted here and re-inserted below with a new rowid
+            self._conn.executemany("DELETE FROM scheme_fts WHERE rowid = ?",
+                                   [(self._rows.pop(key)[0],) for key in stale])
+            fresh = []
+            for key, values in wanted.items():
+                if key not in self._rows:
+                    self._rows[key] = (self._next_rowid, values)
+                    fresh.append((self._next_rowid,) + values)
+                    self._next_rowid += 1
+            self._conn.executemany(
+                f"INSERT INTO scheme_fts (rowid, {', '.join(self.COLUMNS)}) VALUES (?{', ?' * len(self.COLUMNS)})",
+                fresh)
+        return len(fresh), sum(1 for key in stale if key not in wanted)
+
+    def search(self, text, limit=SCHEME_SEARCH_LIMIT, exact_only=False):
+        """Best matching schemes as dicts.
+
+        Tries exact terms, then term prefixes, then any single term, and
+        stops at the first query with hits (exact terms are the cheapest).
+        With exact_only, only names containing every term match.
+
+        bm25() is negative (lower is better); hits far behind the best one,
+        e.g. long names sharing a single common word, are dropped.
+        """
+        terms = [t for t in _SEARCH_TOKEN_RE.findall(text.lower())
+                 if len(t) > 1 and t not in SEARCH_STOPWORDS]
+        if not terms:
+            return []
+        exact = [f'"{t}"' for t in terms]
+        prefix = [f'"{t}"*' for t in terms]  # inflected forms, plurals
+        attempts = [" AND ".join(exact)]
+        if not exact_only:
+            attempts.append(" AND ".join(prefix))
+        if len(terms) > 1 and not exact_only:
+            attempts.append(" OR ".join(prefix))
+        rows = []
+        with self._lock:
+            for query in attempts:
+                rows = self._conn.execute(self._sql, (query, limit)).fetchall()
+                if rows:
+                    break
+        if not rows:
+            return []
+        cutoff = rows[0][-1] * SCHEME_SEARCH_MIN_RELATIVE
+        return [dict(zip(("name", "category", "amount", "apply", "date"), r)) for r in rows if r[-1] <= cutoff]
+
+
+scheme_search = SchemeSearch()
+scheme_search.sync(scheme_catalog.categories)
+
+
+def scheme_reply(lang, schemes, intent=None):
+    """Reply listing the matched schemes, narrowed to one field if an intent was asked."""
+    if lang not in REPLY_LANGS:
+        lang = "en"
+    lines = [reply_texts["scheme_matches"][lang]]
+    for s in schemes:
+        if intent:
+            lines.append(f"• {s['name']}: {s[intent]}")
+        else:
+            lines.append(reply_texts["scheme_line"][lang].format(**s))
+    return "\n".join(lines)
+
+
+def answer_message(text, lang, last_category=None):
+    """Reply to one chat message; returns (reply, category, intent).
+
+    `category` is the category the message named (or whose scheme it
+    named) and becomes the context for later follow-ups; follow-ups
+    (amount/apply/date) answer for `last_category`.
+    """
+    # detect category and follow-up intent (cached per normalized message)
+    category, intent = classify_message(normalize_message(text))
+    # no category named: look for scheme names ("How to apply for PM Kisan"); a follow-up
+    # ("how to apply online?") to a category already asked about only takes a scheme
+    # whose name it spells out, and otherwise answers for that category
+    follow_up = intent is not None and last_category in schemes_db
+    schemes = [] if category else scheme_search.search(text, exact_only=follow_up)
+    if schemes:
+        metrics.inc("chatbot_scheme_search_total")
+        return scheme_reply(lang, schemes, intent), schemes[0]["category"], intent
+    if category:
+        metrics.inc("chatbot_category_total", (("category", category),))
+    elif intent:
+        metrics.inc("chatbot_intent_total", (("intent", intent),))
+    else:
+        metrics.inc("chatbot_fallback_total")
+    return lookup_reply(lang, category, intent, last_category), category, intent
+
+
+def reply_cache_stats():
+    info = classify_message.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "replies": len(reply_table),
+    }
+
+
+# -------------------- Alert streams (server-sent events) --------------------
+def sse_frame(event_id, event, data):
+    """One server-sent event, encoded; `data` is sent as a single line of JSON."""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+SSE_PING = b": ping\n\n"
+
+
+class AlertSubscriber:
+    """One connected client: the frames queued for it and how to wake it up.
+
+    The queue holds at most `maxsize` frames. A client that falls that far
+    behind is marked overflowed and disconnected; it reconnects with
+    Last-Event-ID and catches up from the broadcaster's history instead of
+    holding memory for everything it missed.
+    """
+
+    __slots__ = ("frames", "maxsize", "wake", "overflowed")
+
+    def __init__(self, wake, maxsize=SSE_BUFFER):
+        self.frames = collections.deque()
+        self.maxsize = maxsize
+        self.wake = wake
+        self.overflowed = False
+
+    def push(self, frame):
+        if len(self.frames) >= self.maxsize:
+            self.overflowed = True
+        else:
+            self.frames.append(frame)
+        self.wake()
+
+    def drain(self):
+        frames = []
+        while self.frames:
+            frames.append(self.frames.popleft())
+        return frames
+
+
+class AlertBroadcaster:
+    """Fan-out of one category's alerts to every subscriber of that category.
+
+    Each new alert is encoded once and the same bytes are queued for all
+    subscribers. The last `history` frames are kept for Last-Event-ID
+    resume. Ids are numbered from the catalog's alerts at startup, so they
+    match across workers and restarts while the catalog is unchanged.
+    """
+
+    def __init__(self, category, history=SSE_HISTORY):
+        self.category = category
+        self._lock = threading.Lock()
+        self._history = collections.deque(maxlen=history)  # (id, frame)
+        self._last_id = 0
+        self._known = None  # alert texts already numbered
+        self._subscribers = set()
+
+    def _append(self, alert):
+        self._last_id += 1
+        frame = sse_frame(self._last_id, "alert", {"category": self.category, "alert": alert})
+        self._history.append((self._last_id, frame))
+        return frame
+
+    def sync(self, alerts):
+        """Publish the alerts not seen before; the first call only numbers them. Returns how many were new."""
+        with self._lock:
+            new = [a for a in alerts if self._known is None or a not in self._known]
+            announce = self._known is not None
+            self._known = set(alerts)
+            for alert in new:
+                frame = self._append(alert)
+                if announce:
+                    for sub in self._subscribers:
+                        sub.push(frame)
+            return len(new) if announce else 0
+
+    def subscribe(self, wake, last_event_id=None):
+        """A new AlertSubscriber, primed with the alerts after `last_event_id` when resuming."""
+        sub = AlertSubscriber(wake)
+        with self._lock:
+            if last_event_id is not None:
+                for event_id, frame in self._history:
+                    if event_id > last_event_id:
+                        sub.frames.append(frame)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def wake_all(self):
+        with self._lock:
+            for sub in self._subscribers:
+                sub.wake()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class AlertHub:
+    """The AlertBroadcaster of each category, kept in step with the scheme catalog.
+
+    One heartbeat thread per process wakes every subscriber each
+    SSE_HEARTBEAT seconds (a subscriber with nothing queued sends a ping),
+    so idle streams need no timers of their own. It also checks the catalog
+    for new alerts, since a worker may be serving nothing but streams.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._broadcasters = {}
+        self._heartbeat_pid = None
+
+    def broadcaster(self, category):
+        with self._lock:
+            b = self._broadcasters.get(category)
+            if b is None:
+                b = self._broadcasters[category] = AlertBroadcaster(category)
+            return b
+
+    def subscribe(self, category, wake, last_event_id=None):
+        with self._lock:
+            if self._heartbeat_pid != os.getpid():
+                self._heartbeat_pid = os.getpid()
+                threading.Thread(target=self._heartbeat, name="alert-heartbeat", daemon=True).start()
+        return self.broadcaster(category).subscribe(wake, last_event_id)
+
+    def unsubscribe(self, category, sub):
+        self.broadcaster(category).unsubscribe(sub)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(SSE_HEARTBEAT)
+            try:
+                reload_scheme_catalog()
+            except Exception:
+                logger.exception("alert streams: catalog check failed")
+            with self._lock:
+                broadcasters = list(self._broadcasters.values())
+            for b in broadcasters:
+                b.wake_all()
+
+    def sync(self, schemes):
+        """Publish alerts added to the catalog since the last sync; returns how many."""
+        return sum(self.broadcaster(cat).sync(d.get("alerts", [])) for cat, d in schemes.items())
+
+    def subscribers(self):
+        with self._lock:
+            return {cat: len(b) for cat, b in self._broadcasters.items()}
+
+
+alert_hub = AlertHub()
+alert_hub.sync(schemes_db)
+
+
+def resolve_category(name):
+    """Catalog key for a category name or a loose alias of it ('loan' -> 'loan finance'); None if unknown."""
+    key = name.lower()
+    if key in schemes_db:
+        return key
+    for cat in schemes_db:
+        if cat in key or key in cat:
+            return cat
     return None
 
 
+def _last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# -------------------- Account summaries --------------------
+# Everything /account shows, in one round trip: the user row, the family (email
+# domain) and total user counts, and the last 10 logins as a JSON array.
+ACCOUNT_SUMMARY_SQL = """
+SELECT u.id, u.name, u.email, u.email_domain, u.phone, u.signup_date, u.last_login,
+       CASE WHEN u.email_domain != ''
+            THEN (SELECT count FROM domain_counts WHERE domain = u.email_domain) END AS family_count,
+       (SELECT value FROM counters WHERE name = 'users') AS total_users,
+       (SELECT json_group_array(json_array(login_time, logout_time, ip))
+          FROM (SELECT login_time, logout_time, ip FROM logins
+                 WHERE user_id = k.id ORDER BY login_time DESC LIMIT 10)) AS logins
+  FROM (SELECT ? AS id) AS k LEFT JOIN users u ON u.id = k.id
+"""
+ACCOUNT_USER_FIELDS = ("id", "name", "email", "email_domain", "phone", "signup_date", "last_login")
+
+
+def fetch_account_summary(db, user_id):
+    """The /account template context for `user_id`, from one query; `user` is None if the id is unknown."""
+    row = db.execute(ACCOUNT_SUMMARY_SQL, (user_id,)).fetchone()
+    user = dict(zip(ACCOUNT_USER_FIELDS, row)) if row["id"] is not None else None
+    logins = sorted(json.loads(row["logins"]), key=lambda r: r[0], reverse=True)  # aggregate order isn't guaranteed
+    return {
+        "user": user,
+        "domain": user["email_domain"] if user and user["email_domain"] else "",
+        "family_count": row["family_count"] or 1,
+        "total_users": row["total_users"],
+        "login_history": [{"login_time": t, "logout_time": out, "ip": ip} for t, out, ip in logins],
+    }
+
+
+class AccountSummaryCache:
+    """Per-user /account summaries, invalidated explicitly.
+
+    The user row and login history change with that user's login and logout,
+    which drop the user's entry. The total and per-domain user counts change
+    with any signup; they are held once, outside the entries, so a signup
+    drops only those (a summary whose counts are gone is a miss) instead of
+    every user's entry. Each worker has its own cache, so entries also expire
+    after `ttl` seconds to bound how stale writes from other workers can make them.
+    """
+
+    def __init__(self, max_entries=ACCOUNT_CACHE_MAX_ENTRIES, ttl=ACCOUNT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # user_id -> (expires, user, domain, login_history)
+        self._total_users = None
+        self._family = {}  # domain -> count
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic() and self._total_users is not None:
+                _, user, domain, login_history = entry
+                family_count = self._family.get(domain, 1) if domain else 1
+                if not domain or domain in self._family:
+                    self._entries.move_to_end(user_id)
+                    self.stats["hits"] += 1
+                    return {"user": user, "domain": domain, "family_count": family_count,
+                            "total_users": self._total_users, "login_history": login_history}
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, user_id, summary):
+        if summary["user"] is None:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, summary["user"], summary["domain"],
+                                      summary["login_history"])
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._total_users = summary["total_users"]
+            if summary["domain"]:
+                self._family[summary["domain"]] = summary["family_count"]
+
+    def invalidate_user(self, user_id):
+        """After the user's login or logout."""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate_counts(self, domain=None):
+        """After a signup (in `domain`) or a bulk import (all domains)."""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self._total_users = None
+            if domain is None:
+                self._family.clear()
+            else:
+                self._family.pop(domain, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_users = None
+            self._family.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# -------------------- Page cache --------------------
+class PageCache:
+    """Rendered pages stored once per (endpoint, lang) with gzip/brotli bodies.
+
+    An entry is reused while its version (year, template mtime) is
+    unchanged, so editing a template or the new year re-renders it. Only
+    for views whose output depends on nothing else.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = {}
+        self.stats = {"hits": 0, "renders": 0}
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry["version"] == version:
+                self.stats["hits"] += 1
+                return entry
+        return None
+
+    def put(self, key, version, html):
+        body = html.encode("utf-8")
+        entry = {
+            "version": version,
+            "etag": hashlib.sha256(body).hexdigest()[:20],
+            "identity": body,
+            "gzip": gzip.compress(body, 9),
+            "br": brotli.compress(body, quality=11) if brotli else None,
+        }
+        with self._lock:
+            self._pages[key] = entry
+            self.stats["renders"] += 1
+        return entry
+
+
+page_cache = PageCache()
+
+
+def cached_page(template, **context):
+    """render_template() through page_cache, compressed and revalidated by a strong ETag."""
+    if not PAGE_CACHE:
+        return render_template(template, **context)
+    lang = session.get("lang", "en")
+    filename = current_app.jinja_env.get_or_select_template(template).filename
+    version = (datetime.now().year, os.stat(filename).st_mtime_ns if filename else 0)
+    key = (request.endpoint, lang)
+    page = page_cache.get(key, version)
+    if page is None:
+        page = page_cache.put(key, version, render_template(template, **context))
+
+    encodings = request.accept_encodings
+    encoding = "br" if page["br"] is not None and "br" in encodings else "gzip" if "gzip" in encodings else None
+    etag = f'"{page["etag"]}-{encoding}"' if encoding else f'"{page["etag"]}"'
+    # plain headers: werkzeug's cache_control/vary/make_conditional cost more than rendering these small pages
+    headers = {
+        "Content-Type": "text/html; charset=utf-8",
+        "Vary": "Accept-Encoding, Cookie",  # lang and the login check come from the session
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    match = request.headers.get("If-None-Match", "")
+    if match and (match.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in match.split(","))):
+        return Response(status=304, headers=headers)
+    return Response(page[encoding or "identity"], headers=headers)
+
+
+# ---- Images ----
+_image_fingerprints = {}
+
+
+@functools.cache
+def pil_image():
+    """PIL.Image, imported on first use; None without Pillow (images are then served at their original size)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def image_fingerprint(path):
+    """Short content hash of `path`, recomputed only when its mtime changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _image_fingerprints.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = _image_fingerprints[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+    return cached[1]
+
+
+def image_variant(filename, width):
+    """Path of `filename` resized to `width` px, generated into IMAGE_CACHE_DIR on first use.
+
+    Returns None when Pillow is not installed or the image is already
+    that narrow; the caller then serves the original.
+    """
+    Image = pil_image()
+    if Image is None or filename.endswith(".svg"):
+        return None
+    source = os.path.join(APP_DIR, filename)
+    stem, ext = os.path.splitext(filename)
+    target = os.path.join(IMAGE_CACHE_DIR, f"{stem}-{image_fingerprint(source)}-{width}{ext}")
+    if not os.path.exists(target):
+        with Image.open(source) as img:
+            if img.width <= width:
+                return None
+            resized = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        resized.save(tmp, format=Image.registered_extensions()[ext.lower()], optimize=True)
+        os.replace(tmp, target)
+    return target
+
+
+def image_url(filename, width=None):
+    """Versioned URL for an image next to app.py, optionally a resized variant."""
+    version = image_fingerprint(os.path.join(APP_DIR, filename))
+    return url_for("main.image", filename=filename, w=width, v=version)
+
+
+@bp.cli.command("build-images")
+def build_images():
+    """Pre-generate every IMAGE_WIDTHS variant of the images next to app.py."""
+    if pil_image() is None:
+        print("Pillow is not installed; images will be served at their original size")
+        return
+    for filename in sorted(os.listdir(APP_DIR)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            for width in IMAGE_WIDTHS:
+                path = image_variant(filename, width)
+                print(f"{filename} @{width}px -> {os.path.relpath(path, APP_DIR) if path else 'original'}")
+
+
 # -------------------- ROUTES --------------------
 
 
-@app.context_processor
+@bp.app_context_processor
 def inject_common():
     """Provide common variables (like language and texts) to all templates."""
     lang = session.get("lang", "en")
     return {
         "current_year": datetime.now().year,
         "lang": lang,
-        "texts": texts
+        "texts": texts,
+        "image_url": image_url
     }
 
 
-@app.route("/")
+@bp.route("/")
 def index():
-    return render_template("home.html")
+    return cached_page("home.html")
 
 
 # ---- SIGNUP ----
-@app.route("/signup", methods=["GET", "POST"])
+@bp.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
         name = request.form.get("name")
@@ -289,22 +2539,27 @@ def signup():
         if cur.fetchone():
             return render_template("signup.html", error="Email already registered")
 
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = password_hasher.hash(password)
+        except HashPoolBusy:
+            return render_template("signup.html", error=BUSY_MESSAGE), 503, BUSY_HEADERS
         signup_date = datetime.utcnow().isoformat()
 
         cur.execute(
-            "INSERT INTO users (name, email, phone, password_hash, signup_date) VALUES (?, ?, ?, ?, ?)",
-            (name, email, phone, password_hash, signup_date)
+            "INSERT INTO users (name, email, email_domain, phone, password_hash, signup_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, email, email_domain(email), phone, password_hash, signup_date)
         )
         db.commit()
+        app_state().account_cache.invalidate_counts(email_domain(email))
 
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     return render_template("signup.html")
 
 
 # ---- LOGIN ----
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form.get("email").lower()
@@ -319,8 +2574,19 @@ def login():
         if not user:
             return render_template("login.html", error="User not found")
 
-        if not check_password_hash(user["password_hash"], password):
-            return render_template("login.html", error="Incorrect password")
+        try:
+            if not password_hasher.check(user["password_hash"], password):
+                return render_template("login.html", error="Incorrect password")
+        except HashPoolBusy:
+            return render_template("login.html", error=BUSY_MESSAGE), 503, BUSY_HEADERS
+
+        # upgrade hashes made with an older method/cost while we have the password
+        if password_hasher.needs_rehash(user["password_hash"]):
+            try:
+                cur.execute("UPDATE users SET password_hash = ? WHERE id = ?",
+                            (password_hasher.hash(password), user["id"]))
+            except HashPoolBusy:
+                pass  # retried on the next login
 
         # Set session
         session["user_id"] = user["id"]
@@ -336,14 +2602,15 @@ def login():
 
         cur.execute("UPDATE users SET last_login = ? WHERE id = ?", (login_time, user["id"]))
         db.commit()
+        app_state().account_cache.invalidate_user(user["id"])
 
-        return redirect(url_for("language"))
+        return redirect(url_for("main.language"))
 
     return render_template("login.html")
 
 
 # ---- LOGOUT ----
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     login_id = session.get("login_id")
     db = get_db()
@@ -353,72 +2620,65 @@ def logout():
         logout_time = datetime.utcnow().isoformat()
         cur.execute("UPDATE logins SET logout_time = ? WHERE id = ?", (logout_time, login_id))
         db.commit()
+    if session.get("user_id") is not None:
+        app_state().account_cache.invalidate_user(session["user_id"])
 
     session.clear()
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
 
 
 # ---- LANGUAGE SELECTION ----
-@app.route("/language")
+@bp.route("/language")
 def language():
     # only accessible if logged in (optional). If you want open access, remove this check.
     if "user_id" not in session:
-        return redirect(url_for("login"))
-    return render_template("language.html")
+        return redirect(url_for("main.login"))
+    return cached_page("language.html")
 
 
-@app.route("/set_language/<lang>")
+@bp.route("/set_language/<lang>")
 def set_language(lang):
     # store language in session (en/te/hi)
     if lang not in ("en", "te", "hi"):
         lang = "en"
     session["lang"] = lang
-    return redirect(url_for("state"))
+    return redirect(url_for("main.state"))
 
 
 # ---- STATE PAGE ----
-@app.route("/state")
+@bp.route("/state")
 def state():
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     # states list - for AP-only project, you can pass only AP or AP districts as needed
     states = [
         {"code": "AP", "name": "Andhra Pradesh"},
         # ... add others if needed
     ]
-    return render_template("state.html", states=states)
+    return cached_page("state.html", states=states)
 
 
 # ---- CATEGORIES PAGE ----
-@app.route("/categories")
+@bp.route("/categories")
 def categories():
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     # Pass category labels if needed for translations
     category_list = [
         "student", "farmer", "women", "senior citizen", "job seeker", "entrepreneur",
         "healthcare", "housing", "loan finance", "shg", "minority", "youth", "disability", "ration welfare"
     ]
-    return render_template("categories.html", categories=category_list)
+    return cached_page("categories.html", categories=category_list)
 
 
 # ---- CATEGORY ALERTS / DETAILS ----
-@app.route("/category/<name>")
+@bp.route("/category/<name>")
 def category_page(name):
     if "user_id" not in session:
-        return redirect(url_for("login"))
-    cat_key = name.lower()
-    # normalize alias keys like 'loan' -> 'loan finance'
-    # try find best match
-    if cat_key not in schemes_db:
-        # attempt simple mapping
-        for key in schemes_db:
-            if key in cat_key or cat_key in key:
-                cat_key = key
-                break
-
+        return redirect(url_for("main.login"))
+    cat_key = resolve_category(name) or name.lower()
     data = schemes_db.get(cat_key)
     if not data:
         # if no data found, show empty
@@ -427,28 +2687,104 @@ def category_page(name):
     return render_template("category_alerts.html", cat_key=cat_key, data=data)
 
 
+@bp.route("/category/<name>/alerts/stream")
+def alert_stream(name):
+    """
+    Server-sent events: an `alert` event for each alert added to the category
+    while connected, `: ping` comments every SSE_HEARTBEAT seconds.
+    A reconnecting client's Last-Event-ID header gets it the alerts it missed.
+    Event data: { "category": "...", "alert": "..." }
+
+    Streams are served only under ASGI (AsgiApp), where an open stream waits on
+    the event loop. Under WSGI one would hold a worker for as long as the tab
+    stays open, so this view answers 204 No Content, which tells EventSource
+    clients not to reconnect.
+    """
+    if resolve_category(name) is None:
+        abort(404)
+    return Response(status=204)
+
+
+# ---- SCHEME CATALOG (JSON for the chat page) ----
+@bp.route("/schemes.json")
+def schemes_json():
+    """The whole scheme catalog, gzip'd when accepted; revalidated via ETag / Last-Modified."""
+    use_gzip = "gzip" in request.accept_encodings
+    resp = Response(scheme_catalog.gzip_body if use_gzip else scheme_catalog.body, mimetype="application/json")
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.set_etag(scheme_catalog.etag + ("-gz" if use_gzip else ""))
+    resp.last_modified = scheme_catalog.last_modified
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True  # keep a copy, but revalidate (cheap 304) on each use
+    return resp.make_conditional(request)
+
+
+# ---- IMAGES (long-lived, fingerprinted URLs from image_url()) ----
+@bp.route("/images/<filename>")
+def image(filename):
+    if not filename.lower().endswith(IMAGE_EXTENSIONS) or filename != os.path.basename(filename):
+        abort(404)
+    if not os.path.isfile(os.path.join(APP_DIR, filename)):
+        abort(404)
+    width = request.args.get("w", type=int)
+    path = image_variant(filename, width) if width in IMAGE_WIDTHS else None
+    directory, name = os.path.split(path) if path else (APP_DIR, filename)
+    if not request.args.get("v"):
+        return send_from_directory(directory, name)  # unversioned URL: revalidate
+    resp = send_from_directory(directory, name, max_age=IMAGE_MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
 # ---- CHATBOT PAGE (renders UI) ----
-@app.route("/chatbot")
+@bp.route("/chatbot")
 def chatbot():
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
-    # load user's previous search history
-    db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        "SELECT question, reply, timestamp FROM searches WHERE user_id = ? ORDER BY timestamp ASC",
-        (session["user_id"],)
+    # load only the most recent exchanges; older ones come from /chatbot/history
+    return render_chatbot(*fetch_history_page(get_db(), session["user_id"]))
+
+
+def render_chatbot(rows, before):
+    """The chat page for the newest history page `rows` and its `before` cursor."""
+    # convert rows to simple dicts for template, oldest first
+    history_list = [{"question": r["question"], "reply": r["reply"], "timestamp": r["timestamp"]}
+                    for r in reversed(rows)]
+
+    return render_template(
+        "chatbot.html",
+        history=history_list,
+        history_cursor=encode_cursor(*before) if before else None
     )
-    history = cur.fetchall()
-    # convert rows to simple dicts for template
-    history_list = [{"question": r["question"], "reply": r["reply"], "timestamp": r["timestamp"]} for r in history]
 
-    return render_template("chatbot.html", history=history_list)
+
+@bp.route("/chatbot/history")
+def chatbot_history():
+    """
+    Older chat history, paging backward.
+    Query args: `before` (cursor from the previous page), `limit`.
+    Response:
+    { "history": [{"question", "reply", "timestamp"}, ...] (oldest first), "next_cursor": "..." or null }
+    """
+    if "user_id" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    limit = max(1, min(request.args.get("limit", CHAT_HISTORY_PAGE, type=int), CHAT_HISTORY_PAGE_MAX))
+    before = decode_cursor(request.args.get("before"), 2)
+    rows, next_before = fetch_history_page(get_db(), session["user_id"], before, limit)
+    return jsonify({
+        "history": [{"question": r["question"], "reply": r["reply"], "timestamp": r["timestamp"]}
+                    for r in reversed(rows)],
+        "next_cursor": encode_cursor(*next_before) if next_before else None
+    })
 
 
 # ---- CHATBOT API endpoint (front-end can POST user messages and get JSON reply) ----
-@app.route("/chatbot_api", methods=["POST"])
+@bp.route("/chatbot_api", methods=["POST"])
 def chatbot_api():
     """
     Expected JSON:
@@ -456,124 +2792,536 @@ def chatbot_api():
     Response:
     { "reply": "text reply", "category": "student" (optional) }
     """
+    response, search = chat_reply()
+    if search:
+        app_state().search_log.log(search)
+    return response
+
+
+def chat_reply():
+    """Answer the current /chatbot_api request: (response, search row to log or None)."""
     payload = request.get_json(force=True, silent=True)
     if not payload or "message" not in payload:
-        return jsonify({"error": "invalid request"}), 400
+        return (jsonify({"error": "invalid request"}), 400), None
 
     user_message = payload["message"].strip()
     if user_message == "":
-        return jsonify({"reply": "Please type a question."})
+        return jsonify({"reply": "Please type a question."}), None
 
-    # detect category
-    category = detect_category_from_text(user_message)
-    reply = ""
+    reply, category, intent = answer_message(user_message, session.get("lang", "en"), session.get("last_category"))
     if category:
         # store last asked category in session for follow-ups
         session["last_category"] = category
-        d = schemes_db.get(category, {})
-        # same format as before
-        reply = f"Here are schemes for *{category}*:\n• " + "\n• ".join(d.get("schemes", []))
-    else:
-        # follow-up intent detection (amount/apply/date etc.)
-        last_cat = session.get("last_category")
-        lm = user_message.lower()
-        if "amount" in lm or "how much" in lm or "how much amount" in lm:
-            if last_cat:
-                reply = schemes_db.get(last_cat, {}).get("amount", "Amount details not available.")
-            else:
-                reply = "Please ask about a category first (e.g., 'student schemes')."
-        elif "apply" in lm or "how to apply" in lm:
-            if last_cat:
-                reply = schemes_db.get(last_cat, {}).get("apply", "Apply details not available.")
-            else:
-                reply = "Please specify which category you mean (student, farmer, etc.)."
-        elif "date" in lm or "last date" in lm or "deadline" in lm:
-            if last_cat:
-                # IMPORTANT: previously returned single date; keep behavior but store full
-                reply = schemes_db.get(last_cat, {}).get("date", "Date information not available.")
-            else:
-                reply = "Please specify which scheme or category you mean."
-        else:
-            # fallback: give helpful suggestion
-            reply = ("Sorry, I didn't understand that. Try asking like:\n"
-                     "'Tell me student schemes' or 'How to apply for PM Kisan' or 'Amount for student scholarships'.")
 
     # Persist the search (if user logged in)
     user_id = session.get("user_id")
+    search = None
     if user_id:
-        db = get_db()
-        cur = db.cursor()
-        now = datetime.utcnow().isoformat()
-        cur.execute(
-            "INSERT INTO searches (user_id, question, reply, category, timestamp) VALUES (?, ?, ?, ?, ?)",
-            (user_id, user_message, reply, category, now)
-        )
-        db.commit()
+        search = (user_id, user_message, reply, category, intent, datetime.utcnow().isoformat())
+    return jsonify({"reply": reply, "category": category}), search
+
+
+def _asked_at(value):
+    """A client-supplied ISO timestamp as naive UTC, like the server's own; None if missing.
+
+    Raises ValueError if it can't be parsed.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(value)
+    asked = datetime.fromisoformat(value)
+    if asked.tzinfo is not None:
+        asked = asked.astimezone(timezone.utc).replace(tzinfo=None)
+    return asked.isoformat()
+
+
+@bp.route("/chatbot_api/batch", methods=["POST"])
+def chatbot_api_batch():
+    """
+    Answer messages queued by an offline client, in order, as if sent one by one.
+    Expected JSON:
+    { "messages": ["message", {"message": "message", "timestamp": "ISO time asked"}, ...] }
+    Response:
+    { "replies": [{"reply": "...", "category": "student" or null}, ...] }
+    Follow-ups resolve against the category of earlier messages in the
+    batch; the session is updated once and all search rows are written
+    in one transaction. Timestamps are stored as UTC; one that is not ISO
+    8601 rejects the whole batch with 400.
+    """
+    payload = request.get_json(force=True, silent=True)
+    messages = payload.get("messages") if isinstance(payload, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "invalid request"}), 400
+    if len(messages) > CHATBOT_BATCH_MAX:
+        return jsonify({"error": f"at most {CHATBOT_BATCH_MAX} messages per batch"}), 413
+    asked_at = []
+    for i, item in enumerate(messages):
+        try:
+            asked_at.append(_asked_at(item.get("timestamp") if isinstance(item, dict) else None))
+        except ValueError:
+            return jsonify({"error": f"messages[{i}]: timestamp must be an ISO 8601 time"}), 400
 
-    return jsonify({"reply": reply, "category": category})
+    lang = session.get("lang", "en")
+    last_category = session.get("last_category")
+    user_id = session.get("user_id")
+    now = datetime.utcnow().isoformat()
+    replies, rows = [], []
+    for item, asked in zip(messages, asked_at):
+        text = item.get("message") if isinstance(item, dict) else item
+        text = text.strip() if isinstance(text, str) else ""
+        if not text:
+            replies.append({"reply": "Please type a question.", "category": None})
+            continue
+        reply, category, intent = answer_message(text, lang, last_category)
+        last_category = category or last_category
+        replies.append({"reply": reply, "category": category})
+        if user_id:
+            rows.append((user_id, text, reply, category, intent, asked or now))
+
+    if last_category:
+        session["last_category"] = last_category
+    if rows:
+        app_state().search_log.log_many(rows)
+    return jsonify({"replies": replies})
 
 
 # ---- ADMIN / ACCOUNT / FAMILY INFO ROUTES ----
 
-@app.route("/account")
+@bp.route("/db_stats")
+def db_stats():
+    """Connection pool, search-log buffer and reply cache stats for this worker process."""
+    # NOTE: In production, restrict with admin check
+    return jsonify({
+        "pool": app_state().pool.stats(),
+        "search_log": dict(app_state().search_log.stats),
+        "reply_cache": reply_cache_stats(),
+        "page_cache": dict(page_cache.stats)
+    })
+
+
+@bp.route("/analytics")
+def analytics():
+    """Daily questions by category and intent, fallback replies and logins per hour.
+
+    Reads only the rollup tables. The window starts at `since`
+    (YYYY-MM-DD) or `days` (default ANALYTICS_DAYS) back from today (UTC).
+    """
+    # NOTE: In production, restrict with admin check
+    days = min(max(request.args.get("days", ANALYTICS_DAYS, type=int), 1), ANALYTICS_DAYS_MAX)
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date().isoformat()
+    if request.args.get("since"):
+        try:
+            since = datetime.strptime(request.args["since"], "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            return jsonify({"error": "since must be YYYY-MM-DD"}), 400
+    db = get_db()
+
+    by_day = {}
+    for row in db.execute("SELECT day, category, intent, count FROM search_daily WHERE day >= ? ORDER BY day",
+                          (since,)):
+        day = by_day.setdefault(row["day"], {"day": row["day"], "questions": 0, "fallback": 0,
+                                             "categories": {}, "intents": {}})
+        day["questions"] += row["count"]
+        if row["category"]:
+            day["categories"][row["category"]] = day["categories"].get(row["category"], 0) + row["count"]
+        if row["intent"]:
+            day["intents"][row["intent"]] = day["intents"].get(row["intent"], 0) + row["count"]
+        if not row["category"] and not row["intent"]:
+            day["fallback"] += row["count"]
+
+    logins = db.execute("SELECT hour, count FROM login_hourly WHERE hour >= ? ORDER BY hour", (since,))
+    return jsonify({
+        "since": since,
+        "days": list(by_day.values()),
+        "logins_per_hour": [{"hour": row["hour"], "logins": row["count"]} for row in logins],
+        "backfill": rollup_backfill_status(db),
+    })
+
+
+@bp.route("/account")
 def account():
     """Show logged-in user's basic account info and family counts (by email domain)."""
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
-    db = get_db()
-    cur = db.cursor()
     user_id = session["user_id"]
+    cache = app_state().account_cache
+    summary = cache.get(user_id) if ACCOUNT_CACHE else None
+    if summary is None:
+        summary = fetch_account_summary(get_db(), user_id)
+        if ACCOUNT_CACHE:
+            cache.put(user_id, summary)
+    return render_template("account.html", **summary)
+
+
+@bp.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint for this worker process."""
+    # NOTE: In production, restrict with admin check or to the scrape network
+    state = app_state()
+    pool = state.pool.stats()
+    reply = reply_cache_stats()
+    gauges = [
+        ("db_pool_connections", (("state", "in_use"),), pool["in_use"]),
+        ("db_pool_connections", (("state", "idle"),), pool["idle"]),
+        ("db_pool_waits_total", (), pool["waits"]),
+        ("db_pool_wait_max_seconds", (), pool["wait_max_ms"] / 1000),
+        ("reply_cache_hits_total", (), reply["hits"]),
+        ("reply_cache_misses_total", (), reply["misses"]),
+    ]
+    gauges += [("search_log_rows_total", (("state", k),), v) for k, v in state.search_log.stats.items()]
+    gauges += [("alert_stream_subscribers", (("category", c),), n) for c, n in alert_hub.subscribers().items()]
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
 
-    # user info
-    cur.execute("SELECT id, name, email, phone, signup_date, last_login FROM users WHERE id = ?", (user_id,))
-    user = cur.fetchone()
-
-    # family by email domain: extract domain of current user and count users with same domain
-    email = user["email"] if user else ""
-    domain = ""
-    family_count = 1
-    if "@" in email:
-        domain = email.split("@", 1)[1]
-        cur.execute("SELECT COUNT(*) as cnt FROM users WHERE email LIKE ?", (f"%@{domain}",))
-        family_count = cur.fetchone()["cnt"]
-
-    # total number of registered users
-    cur.execute("SELECT COUNT(*) as cnt FROM users")
-    total_users = cur.fetchone()["cnt"]
 
-    # last 10 login records for this user
-    cur.execute("SELECT login_time, logout_time, ip FROM logins WHERE user_id = ? ORDER BY login_time DESC LIMIT 10", (user_id,))
-    login_history = cur.fetchall()
+@bp.route("/all_users")
+def all_users():
+    """(Optional) Admin-style page showing users (one page at a time) and their domains.
 
+    Query args: `limit` (page size, capped at USERS_PAGE_SIZE_MAX) and
+    `after` (the `next_cursor` of the previous page).
+    """
+    # NOTE: In production, restrict with admin check
+    db = get_db()
+    limit = max(1, min(request.args.get("limit", USERS_PAGE_SIZE, type=int), USERS_PAGE_SIZE_MAX))
+    after = decode_cursor(request.args.get("after"), 2)
+    rows, next_after = fetch_users_page(db, after, limit)
+    # domain counts are maintained by trigger on users
+    cur = db.execute("SELECT domain, count FROM domain_counts WHERE count > 0")
+    domain_counts = {r["domain"]: r["count"] for r in cur.fetchall()}
     return render_template(
-        "account.html",
-        user=user,
-        domain=domain,
-        family_count=family_count,
-        total_users=total_users,
-        login_history=login_history
+        "all_users.html",
+        users=rows,
+        domain_counts=domain_counts,
+        limit=limit,
+        next_cursor=encode_cursor(*next_after) if next_after else None
     )
 
 
-@app.route("/all_users")
-def all_users():
-    """(Optional) Admin-style page showing all users and their domains."""
+@bp.route("/all_users/export")
+def all_users_export():
+    """Stream every user as CSV (default) or JSONL (`?format=jsonl`) in constant memory."""
     # NOTE: In production, restrict with admin check
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT id, name, email, phone, signup_date, last_login FROM users ORDER BY signup_date ASC")
-    rows = cur.fetchall()
-    # compute domain counts
-    domain_counts = {}
-    for r in rows:
-        em = r["email"]
-        dom = em.split("@", 1)[1] if "@" in em else ""
-        domain_counts[dom] = domain_counts.get(dom, 0) + 1
-    return render_template("all_users.html", users=rows, domain_counts=domain_counts)
+    fmt = request.args.get("format", "csv")
+    if fmt != "jsonl":
+        fmt = "csv"
+    fields = [c.strip() for c in USER_LIST_COLUMNS.split(",")]
+    body = encode_rows(iter_users(get_db()), fields, fmt)
+    mimetype = "application/x-ndjson" if fmt == "jsonl" else "text/csv"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=users.{fmt}"}
+    )
+
+
+# -------------------- App factory --------------------
+class AppState:
+    """What an app from create_app() keeps for its DATABASE.
+
+    The connection pool, the search log writer (and its reply ids), the
+    server-side session store (None for cookie sessions) and the account
+    summary cache. Kept in `app.extensions`, so two apps on different
+    databases never share any of them.
+    """
+
+    def __init__(self, database, session_backend):
+        self.pool = ConnectionPool(database)
+        self.search_log = SearchLogWriter(self.pool)
+        self.session_store = make_session_store(session_backend, self.pool)
+        self.account_cache = AccountSummaryCache()
+
+    def close(self):
+        self.search_log.close()
+
+
+def app_state(flask_app=None):
+    """The AppState of `flask_app`, by default the app of the current request or command."""
+    return (flask_app or current_app).extensions["mee_sahayam"]
+
+
+def init_app_state(flask_app):
+    """(Re)build flask_app's AppState from its DATABASE and SESSION_BACKEND settings."""
+    old = flask_app.extensions.get("mee_sahayam")
+    if old is not None:
+        old.close()
+    state = flask_app.extensions["mee_sahayam"] = AppState(flask_app.config["DATABASE"],
+                                                           flask_app.config["SESSION_BACKEND"])
+    atexit.register(state.close)
+    if state.session_store is None:
+        flask_app.session_interface = SecureCookieSessionInterface()
+    else:
+        flask_app.session_interface = ServerSessionInterface(state.session_store)
+    return state
+
+
+def create_app(config=None):
+    """Build a Flask app serving `bp`.
+
+    `config` is a dict overriding the defaults below or any Flask setting.
+    Workers only read the schema version here (one query, no write lock);
+    migrations run once per deploy from `flask migrate`, or here when
+    MIGRATE_ON_START is set.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY=SECRET_KEY,
+        DATABASE=DB_PATH,
+        SESSION_BACKEND=SESSION_BACKEND,
+        MIGRATE_ON_START=MIGRATE_ON_START,
+    )
+    app.config.update(config or {})
+    app.register_blueprint(bp)
+    app.teardown_appcontext(close_connection)
+    pool = init_app_state(app).pool
+
+    conn = pool.acquire()
+    try:
+        if app.config["MIGRATE_ON_START"]:
+            migrate_db(conn)
+        elif schema_version(conn) < len(MIGRATIONS) - 1:
+            app.logger.warning("database schema is at version %d, this code expects %d: run `flask migrate`",
+                               schema_version(conn), len(MIGRATIONS) - 1)
+    finally:
+        pool.release(conn)
+    return app
+
+
+# -------------------- ASGI serving --------------------
+# Async versions of the chat views, used only by AsgiApp; WSGI servers get the plain views.
+async def chatbot_async():
+    if "user_id" not in session:
+        return redirect(url_for("main.login"))
+    return render_chatbot(*await run_db(fetch_history_page, session["user_id"]))
+
+
+async def chatbot_api_async():
+    response, search = chat_reply()
+    if search:
+        await run_blocking(app_state().search_log.log, search)
+    return response
+
+
+ASYNC_VIEWS = {"main.chatbot": chatbot_async, "main.chatbot_api": chatbot_api_async}
+
+
+def asgi_environ(scope, body):
+    """WSGI environ for an ASGI http scope whose request body has been read into `body`."""
+    root = scope.get("root_path", "")
+    path = scope["path"][len(root):] if scope["path"].startswith(root) else scope["path"]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root.encode("utf8").decode("latin1"),
+        "PATH_INFO": path.encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.input_terminated": True,  # the whole body is buffered, even for a chunked upload
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    environ.setdefault("CONTENT_LENGTH", str(len(body)))
+    return environ
+
+
+class AsgiApp:
+    """ASGI entry point for a Flask app from create_app(): `uvicorn --factory app:create_asgi_app`.
+
+    Requests for ASYNC_VIEWS are dispatched on the event loop: the request
+    context is pushed in the request's own task, the session is opened and
+    saved in db_executor, and the view awaits run_db() for its queries, so a
+    request waiting on SQLite holds no thread. Every other route is served by
+    the unchanged WSGI app on a thread from a pool of `wsgi_threads`, except
+    alert streams, which wait on the event loop as well.
+    """
+
+    def __init__(self, flask_app, wsgi_threads=ASGI_WSGI_THREADS):
+        self.app = flask_app
+        self._urls = flask_app.url_map.bind("localhost")
+        self._wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        endpoint, args = self._match(scope)
+        if endpoint in ASYNC_VIEWS:
+            return await self._dispatch(scope, receive, send)
+        if endpoint == "main.alert_stream" and resolve_category(args["name"]) is not None:
+            return await self._alert_stream(scope, receive, send, resolve_category(args["name"]))
+        await self._wsgi(scope, receive, send)
+
+    @staticmethod
+    async def _read_body(receive):
+        """The whole request body, or None if the client disconnected first."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return bytes(body)
+
+    async def _wsgi(self, scope, receive, send):
+        """Run the WSGI app on pool threads; the body is pulled from its iterable chunk by chunk.
+
+        Every step runs in the same contextvars context, so a streamed body
+        (stream_with_context) finds the request context it pushed even when
+        the next chunk is pulled on another thread.
+        """
+        import asyncio
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        environ = asgi_environ(scope, body)
+        context = contextvars.Context()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), headers]
+
+        def start():
+            result = self.app(environ, start_response)
+            chunks = iter(result)
+            return result, chunks, next(chunks, None)
+
+        result, chunks, chunk = await loop.run_in_executor(self._wsgi_executor, context.run, start)
+        try:
+            status, headers = started
+            await send({"type": "http.response.start", "status": status,
+                        "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]})
+            while chunk is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self._wsgi_executor, context.run, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self._wsgi_executor, context.run, result.close)
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _match(self, scope):
+        try:
+            return self._urls.match(scope["path"][len(scope.get("root_path", "")):], scope["method"])
+        except Exception:  # 404/405/redirects: let the WSGI app answer them
+            return None, None
+
+    async def _alert_stream(self, scope, receive, send, category):
+        """alert_stream on the event loop: an idle subscriber costs a task and an asyncio.Event, not a thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        headers = dict(scope["headers"])
+        last_id = _last_event_id(headers.get(b"last-event-id", b"").decode("latin1") or None)
+        sub = alert_hub.subscribe(category, lambda: loop.call_soon_threadsafe(ready.set), last_id)
+
+        async def until_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        gone = asyncio.ensure_future(until_disconnect())
+        gone.add_done_callback(lambda _: ready.set())
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            await send({"type": "http.response.body", "body": f"retry: {SSE_RETRY_MS}\n\n".encode(),
+                        "more_body": True})
+            while not sub.overflowed:
+                await ready.wait()
+                ready.clear()
+                if gone.done():
+                    return
+                frames = sub.drain()
+                await send({"type": "http.response.body", "body": b"".join(frames) if frames else SSE_PING,
+                            "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            alert_hub.unsubscribe(category, sub)
+            gone.cancel()
+
+    async def _dispatch(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+
+        flask_app = self.app
+        environ = asgi_environ(scope, body)
+        req = flask_app.request_class(environ)
+        req.json_module = flask_app.json
+        # opened here rather than by push() so a blocking session store doesn't stall the loop
+        interface = flask_app.session_interface
+        sess = await run_blocking(interface.open_session, flask_app, req)
+        if sess is None:
+            sess = interface.make_null_session(flask_app)
+        ctx = RequestContext(flask_app, environ, request=req, session=sess)
+        error = None
+        ctx.push()
+        try:
+            try:
+                response = await self._full_dispatch(ctx.request)
+            except Exception as e:
+                error = e
+                response = flask_app.handle_exception(e)
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in response.headers.items()],
+            })
+            await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else response.get_data()})
+        finally:
+            ctx.pop(error)
+
+    async def _full_dispatch(self, req):
+        # Flask.full_dispatch_request, awaiting the view instead of running it to completion in a thread
+        flask_app = self.app
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                if req.routing_exception is not None:
+                    flask_app.raise_routing_exception(req)
+                rv = await ASYNC_VIEWS[req.endpoint](**req.view_args)
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+        return await run_blocking(flask_app.finalize_request, rv)
+
+
+def create_asgi_app(config=None):
+    """create_app(config) wrapped for an ASGI server."""
+    return AsgiApp(create_app(config))
 
 
 # -------------------- STATIC RUN --------------------
+# Production: `flask --app app migrate` once, then e.g. `gunicorn 'app:create_app()'`.
+# Async serving: `uvicorn --factory app:create_asgi_app` (needs uvicorn).
 if __name__ == "__main__":
     # debug True for development only
-    app.run(debug=True)
+    create_app({"MIGRATE_ON_START": True}).run(debug=True)
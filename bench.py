@@ -0,0 +1,1553 @@
+"""Benchmarks for Mee Sahayam.
+
+Usage:
+    python bench.py matcher [--messages N] [--repeat R]
+    python bench.py search_log [--rows N] [--threads T]
+    python bench.py all_users [--users N] [--page-size P]
+    python bench.py replies [--messages N] [--distinct D]
+    python bench.py hashing [--logins N] [--cheap N] [--server-threads T]
+    python bench.py scheme_search [--schemes N] [--queries N]
+    python bench.py sessions [--messages N]
+    python bench.py reply_storage [--rows N]
+    python bench.py import [--rows N] [--hash-sample N]
+    python bench.py pages [--sessions N] [--revisits R]
+    python bench.py chat_batch [--messages N] [--batch-sizes 10,50,100]
+    python bench.py alerts [--subscribers N] [--heartbeat S] [--idle S]
+
+Load testing:
+    python bench.py seed [--db PATH] [--users N] [--logins N] [--searches N]
+    python bench.py load [--db PATH] [--routes a,b] [--concurrency C] [--requests N]
+                         [--server testclient|wsgi|asgi] [--out results.json]
+    python bench.py analytics [--searches N] [--logins N] [--batch-size B]
+    python bench.py archive [--searches N] [--keep-days D] [--batch-size B]
+    python bench.py concurrency [--db PATH] [--levels 1,8,32,128] [--requests N]
+    python bench.py startup [--app-dir DIR] [--workers N] [--rounds R] [--hold-write-lock S]
+    python bench.py compare baseline.json candidate.json [--threshold PCT]
+"""
+import argparse
+import asyncio
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import http.cookiejar
+import json as _json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import jinja2
+import werkzeug.serving
+
+try:
+    import uvicorn
+except ImportError:  # only the asgi server needs it
+    uvicorn = None
+
+import app
+
+
+# -------------------- Corpus --------------------
+FILLER = (
+    "please tell me about the schemes for my family gold homework old "
+    "what is available in our village can you help with details thanks"
+).split()
+
+
+def make_corpus(n, seed=42):
+    """Synthetic chat messages: filler words mixed with aliases and intents."""
+    rnd = random.Random(seed)
+    keywords = list(app._keyword_lookup)
+    corpus = []
+    for _ in range(n):
+        words = rnd.choices(FILLER, k=rnd.randint(3, 20))
+        for _ in range(rnd.randint(0, 2)):
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(keywords))
+        corpus.append(" ".join(words))
+    return corpus
+
+
+# -------------------- App wiring --------------------
+# Stand-ins for templates the routes render but this checkout does not ship.
+STANDIN_TEMPLATES = {
+    "account.html": (
+        "{{ user['name'] }} {{ domain }} {{ family_count }} {{ total_users }}"
+        "{% for l in login_history %}<li>{{ l['login_time'] }} {{ l['ip'] }}</li>{% endfor %}"
+    ),
+    "all_users.html": (
+        "{% for u in users %}<tr><td>{{ u['name'] }}</td><td>{{ u['email'] }}</td></tr>{% endfor %}"
+        "{% for d, c in domain_counts.items() %}{{ d }}={{ c }} {% endfor %}{{ next_cursor }}"
+    ),
+    "category_alerts.html": "{{ cat_key }}{% for a in data['alerts'] %}<li>{{ a }}</li>{% endfor %}",
+}
+
+
+# The app under test, built by the first _use_database() call so that importing this
+# module never opens (or switches to WAL) the database in the checkout.
+flask_app = None
+
+
+def _use_checkout_templates():
+    """Render the HTML pages next to app.py, falling back to STANDIN_TEMPLATES."""
+    flask_app.jinja_env.loader = jinja2.ChoiceLoader([
+        jinja2.FileSystemLoader(app.APP_DIR),
+        jinja2.DictLoader(STANDIN_TEMPLATES),
+    ])
+
+
+def _use_database(path):
+    """Point flask_app at `path` (migrating it) with a fresh pool, search log and session store; returns the pool."""
+    global flask_app
+    if flask_app is None:
+        flask_app = app.create_app({"DATABASE": path, "MIGRATE_ON_START": True})
+        pool = app.app_state(flask_app).pool
+    else:
+        flask_app.config["DATABASE"] = path
+        pool = app.init_app_state(flask_app).pool
+    conn = pool.acquire()
+    app.init_db(conn)
+    pool.release(conn)
+    return pool
+
+
+def _use_scratch_database():
+    """_use_database() on an empty database that is removed at exit."""
+    tmpdir = tempfile.mkdtemp(prefix="bench-")
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    return _use_database(os.path.join(tmpdir, "bench.db"))
+
+
+# -------------------- Matcher --------------------
+def legacy_detect_category(text):
+    """The substring scan detect_category_from_text used before the compiled matcher."""
+    t = text.lower()
+    for cat, keys in app.category_aliases.items():
+        for k in keys:
+            if k in t:
+                return cat
+    return None
+
+
+def legacy_detect_intent(text):
+    lm = text.lower()
+    if "amount" in lm or "how much" in lm:
+        return "amount"
+    if "apply" in lm:
+        return "apply"
+    if "date" in lm or "deadline" in lm:
+        return "date"
+    return None
+
+
+def _time_per_message(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in corpus:
+            fn(msg)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+
+def bench_matcher(args):
+    corpus = make_corpus(args.messages)
+
+    def legacy(msg):
+        return legacy_detect_category(msg) or legacy_detect_intent(msg)
+
+    before = _time_per_message(legacy, corpus, args.repeat)
+    after = _time_per_message(app.match_text, corpus, args.repeat)
+    print(f"{len(corpus)} messages, best of {args.repeat}")
+    print(f"  {'legacy (category + intent)':32s} {before * 1e6:8.2f} us/msg")
+    print(f"  {'match_text (category + intent)':32s} {after * 1e6:8.2f} us/msg   ({after / before:.1f}x the legacy cost)")
+
+    disagree = sum(1 for m in corpus if legacy_detect_category(m) != app.detect_category_from_text(m))
+    print(f"  category differs from legacy on {disagree} messages")
+    print("  match_text is not faster than the substring scan it replaced: the gain is correctness "
+          "(word boundaries, Telugu/Hindi aliases, ranking), not speed")
+
+
+# -------------------- Replies --------------------
+def legacy_reply(message, last_cat):
+    """chatbot_api's reply logic before the reply table; returns (reply, new last_cat)."""
+    category = legacy_detect_category(message)
+    if category:
+        d = app.schemes_db.get(category, {})
+        return f"Here are schemes for *{category}*:\n• " + "\n• ".join(d.get("schemes", [])), category
+    intent = legacy_detect_intent(message)
+    if intent == "amount":
+        if last_cat:
+            return app.schemes_db.get(last_cat, {}).get("amount", "Amount details not available."), last_cat
+        return "Please ask about a category first (e.g., 'student schemes').", last_cat
+    if intent == "apply":
+        if last_cat:
+            return app.schemes_db.get(last_cat, {}).get("apply", "Apply details not available."), last_cat
+        return "Please specify which category you mean (student, farmer, etc.).", last_cat
+    if intent == "date":
+        if last_cat:
+            return app.schemes_db.get(last_cat, {}).get("date", "Date information not available."), last_cat
+        return "Please specify which scheme or category you mean.", last_cat
+    return ("Sorry, I didn't understand that. Try asking like:\n"
+            "'Tell me student schemes' or 'How to apply for PM Kisan' or 'Amount for student scholarships'."), last_cat
+
+
+def cached_reply(message, last_cat):
+    category, intent = app.classify_message(app.normalize_message(message))
+    last_cat = category or last_cat
+    return app.lookup_reply("en", category, intent, last_cat), last_cat
+
+
+def make_replay_log(n, distinct, seed=7):
+    """n messages drawn Zipf-like from `distinct` unique questions, as real chat logs are."""
+    rnd = random.Random(seed)
+    pool = make_corpus(distinct, seed=seed)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rnd.choices(pool, weights=weights, k=n)
+
+
+def bench_replies(args):
+    log = make_replay_log(args.messages, args.distinct)
+    results = {}
+    for name, fn in (("legacy", legacy_reply), ("reply table + LRU", cached_reply)):
+        app.classify_message.cache_clear()
+        last_cat = None
+        start = time.process_time()
+        for msg in log:
+            _, last_cat = fn(msg, last_cat)
+        results[name] = (time.process_time() - start) / len(log)
+    stats = app.reply_cache_stats()
+
+    print(f"{len(log)} messages replayed, {args.distinct} distinct")
+    for name, per_msg in results.items():
+        print(f"  {name:20s} {per_msg * 1e6:8.2f} us CPU/msg")
+    print(f"  cache hit rate {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['misses']} misses)")
+
+
+# -------------------- Scheme search --------------------
+SCHEME_WORDS = ("pradhan mantri rashtriya gramin shahari mahila kisan yuva vikas suraksha bima awas "
+                "shiksha swasthya rojgar udyam nidhi kalyan samriddhi jyoti sampada").split()
+
+
+def make_catalog(n, seed=11):
+    """Catalog in schemes.json shape with ~n schemes, derived from the real one."""
+    rnd = random.Random(seed)
+    base = app.scheme_catalog.categories
+    cats = {cat: dict(d, schemes=[]) for cat, d in base.items()}
+    templates = [(cat, s) for cat, d in base.items() for s in d["schemes"]]
+    for i in range(n):
+        cat, s = templates[i % len(templates)]
+        name = f"{s['name']} {' '.join(rnd.sample(SCHEME_WORDS, 2))} {i}"
+        cats[cat]["schemes"].append(dict(s, name=name))
+    return cats
+
+
+def bench_scheme_search(args):
+    catalog = make_catalog(args.schemes)
+    names = [s["name"] for d in catalog.values() for s in d["schemes"]]
+    rnd = random.Random(12)
+    queries = []
+    for _ in range(args.queries):
+        words = rnd.choice(names).split()
+        queries.append("how to apply for " + " ".join(rnd.sample(words, min(2, len(words)))))
+
+    index = app.SchemeSearch()
+    start = time.perf_counter()
+    index.sync(catalog)
+    full = time.perf_counter() - start
+
+    for q in queries[:100]:
+        index.search(q)
+    latencies = []
+    found = 0
+    for q in queries:
+        start = time.perf_counter()
+        found += bool(index.search(q))
+        latencies.append(time.perf_counter() - start)
+
+    changed = {cat: dict(d, schemes=list(d["schemes"])) for cat, d in catalog.items()}
+    first = next(iter(changed))
+    changed[first]["schemes"][0] = dict(changed[first]["schemes"][0], amount="changed")
+    start = time.perf_counter()
+    written, removed = index.sync(changed)
+    incremental = time.perf_counter() - start
+
+    print(f"{len(names)} schemes, {len(queries)} queries ({found} answered)")
+    print(f"  full index build        {full * 1000:8.1f} ms")
+    print(f"  incremental sync        {incremental * 1000:8.1f} ms ({written} written, {removed} removed)")
+    print(f"  query p50 {_percentile(latencies, 50) * 1000:.3f} ms   p99 {_percentile(latencies, 99) * 1000:.3f} ms   "
+          f"mean {statistics.fmean(latencies) * 1000:.3f} ms")
+
+
+# -------------------- Sessions --------------------
+def make_conversation(n, seed=5):
+    """A topic question followed by a few follow-ups about it, repeated."""
+    rnd = random.Random(seed)
+    topics = list(app.category_aliases.items())
+    intents = [aliases[0] for aliases in app.intent_keywords.values()]
+    messages = []
+    while len(messages) < n:
+        category, aliases = rnd.choice(topics)
+        messages.append(f"schemes for {rnd.choice(aliases)}")
+        messages.extend(f"what is the {rnd.choice(intents)}" for _ in range(rnd.randint(1, 4)))
+    return messages[:n]
+
+
+def bench_sessions(args):
+    """Cookie bytes and CPU per chat message for each session backend."""
+    corpus = make_conversation(args.messages)
+    saves = ("session_store_ops_total", (("op", "save"),))
+    print(f"{args.messages} chat messages (topic + follow-ups) from one logged-in client")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _use_database(os.path.join(tmpdir, "bench.db"))
+        cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+        for backend in ("cookie", "memory", "sqlite"):
+            flask_app.config["SESSION_BACKEND"] = backend
+            app.init_app_state(flask_app)
+            client = flask_app.test_client()
+            with client.session_transaction() as sess:
+                sess.update(user_id=1, user_email="someone@example.com", user_name="Some One",
+                            login_id=1, lang="te")
+            for msg in corpus[:200]:
+                client.post("/chatbot_api", json={"message": msg})
+            saved_before = app.metrics._counters.get(saves, 0)
+            sent = received = set_cookies = 0
+            cpu = time.process_time()
+            start = time.perf_counter()
+            for msg in corpus:
+                cookie = client.get_cookie(cookie_name)
+                sent += len(f"{cookie_name}={cookie.value}") if cookie else 0
+                resp = client.post("/chatbot_api", json={"message": msg})
+                headers = resp.headers.getlist("Set-Cookie")
+                received += sum(len(h) for h in headers)
+                set_cookies += bool(headers)
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+            n = len(corpus)
+            writes = app.metrics._counters.get(saves, 0) - saved_before if backend != "cookie" else set_cookies
+            print(f"  {backend:7s} cookie sent {sent / n:6.1f} B/req   set-cookie {received / n:6.1f} B/req "
+                  f"({set_cookies} responses)   session writes {writes:5d}   "
+                  f"cpu {cpu / n * 1e6:6.1f} us/req   wall {wall / n * 1e6:6.1f} us/req")
+            app.app_state(flask_app).search_log.flush()
+
+
+# -------------------- Batch chat API --------------------
+def bench_chat_batch(args):
+    """Messages/s through /chatbot_api one at a time vs /chatbot_api/batch."""
+    corpus = make_conversation(args.messages)
+    print(f"{len(corpus)} queued messages (topic + follow-ups) from one logged-in kiosk")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        _use_database(os.path.join(tmpdir, "bench.db"))
+        search_log = app.app_state(flask_app).search_log
+
+        def client():
+            c = flask_app.test_client()
+            with c.session_transaction() as sess:
+                sess.update(user_id=1, lang="en")
+            for msg in corpus[:100]:
+                c.post("/chatbot_api", json={"message": msg})  # warm the caches
+            return c
+
+        for sync in (True, False):
+            search_log.sync = sync
+            c = client()
+            start = time.perf_counter()
+            for msg in corpus:
+                c.post("/chatbot_api", json={"message": msg})
+            search_log.flush()
+            elapsed = time.perf_counter() - start
+            label = "commit per message" if sync else "write-behind log"
+            print(f"  {'single, ' + label:30s} {len(corpus) / elapsed:8.0f} msg/s")
+        for size in args.batch_sizes:
+            c = client()
+            start = time.perf_counter()
+            for i in range(0, len(corpus), size):
+                c.post("/chatbot_api/batch", json={"messages": corpus[i:i + size]})
+            elapsed = time.perf_counter() - start
+            print(f"  {f'batch of {size}':30s} {len(corpus) / elapsed:8.0f} msg/s")
+
+
+# -------------------- Page cache --------------------
+PAGE_ROUTES = ("/", "/language", "/state", "/categories")
+
+
+def bench_pages(args):
+    """A browsing session over the static-ish pages: first visits, then revisits that revalidate."""
+    _use_scratch_database()
+    _use_checkout_templates()
+    headers = {"Accept-Encoding": "gzip, deflate, br"}
+    print(f"{args.sessions} sessions x {len(PAGE_ROUTES)} pages, {args.revisits} revisits each "
+          f"(brotli {'on' if app.brotli else 'not installed'})")
+    endpoints = [flask_app.url_map.bind("").match(path)[0] for path in PAGE_ROUTES]
+    originals = {e: flask_app.view_functions[e] for e in endpoints}
+    in_views = []
+
+    def timed_view(fn):
+        def view(**kwargs):
+            start = time.process_time()
+            try:
+                return fn(**kwargs)
+            finally:
+                in_views.append(time.process_time() - start)
+        return view
+
+    for e, fn in originals.items():
+        flask_app.view_functions[e] = timed_view(fn)
+    for cached in (False, True):
+        app.PAGE_CACHE = cached
+        app.page_cache = app.PageCache()
+        in_views.clear()
+        sent = requests = 0
+        cpu = time.process_time()
+        for i in range(args.sessions):
+            client = flask_app.test_client()
+            with client.session_transaction() as sess:
+                sess.update(user_id=1, lang=("en", "te", "hi")[i % 3])
+            etags = {}
+            for visit in range(1 + args.revisits):
+                for path in PAGE_ROUTES:
+                    extra = {"If-None-Match": etags[path]} if path in etags else {}
+                    resp = client.get(path, headers={**headers, **extra})
+                    if resp.headers.get("ETag"):
+                        etags[path] = resp.headers["ETag"]
+                    sent += len(resp.data)
+                    requests += 1
+        cpu = time.process_time() - cpu
+        print(f"  page cache {'on ' if cached else 'off'}  body {sent / requests:7.1f} B/req   "
+              f"view cpu {statistics.fmean(in_views) * 1e6:6.1f} us/req   request cpu {cpu / requests * 1e6:6.1f} us/req   "
+              f"renders {app.page_cache.stats['renders'] if cached else requests}")
+    app.PAGE_CACHE = True
+    flask_app.view_functions.update(originals)
+
+    path = os.path.join(app.APP_DIR, "robot.png")
+    if app.pil_image() is None:
+        print(f"  robot.png {os.path.getsize(path)} B; Pillow not installed, no resized variants")
+    else:
+        print(f"  robot.png {os.path.getsize(path)} B; variants: " + ", ".join(
+            f"{w}px {os.path.getsize(app.image_variant('robot.png', w) or path)} B" for w in app.IMAGE_WIDTHS))
+
+
+# -------------------- Password hashing --------------------
+def bench_hashing(args):
+    """A login surge and cheap page views share one fixed pool of server threads."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = _use_database(os.path.join(tmpdir, "bench.db"))
+        _use_checkout_templates()
+        pwhash = app.generate_password_hash("secret", method=app.password_hasher.method)
+        conn = pool.acquire()
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (name, email, email_domain, phone, password_hash, signup_date) "
+                "VALUES (?, ?, 'x.in', '', ?, '')",
+                [(f"u{i}", f"u{i}@x.in", pwhash) for i in range(args.logins)])
+        pool.release(conn)
+
+        def login(i):
+            client = flask_app.test_client()
+            start = time.perf_counter()
+            status = client.post("/login", data={"email": f"u{i}@x.in", "password": "secret"}).status_code
+            return "/login", status, time.perf_counter() - start
+
+        def cheap(_):
+            client = flask_app.test_client()
+            start = time.perf_counter()
+            status = client.get("/schemes.json").status_code
+            return "/schemes.json", status, time.perf_counter() - start
+
+        jobs = [(login, i) for i in range(args.logins)] + [(cheap, i) for i in range(args.cheap)]
+        random.Random(1).shuffle(jobs)
+
+        print(f"{args.logins} logins + {args.cheap} page views on {args.server_threads} server threads, "
+              f"method {app.password_hasher.method}")
+        for offload in (False, True):
+            app.password_hasher.offload = offload
+            if offload:
+                app.password_hasher.hash("warm-up")  # start worker processes outside the timing
+            with ThreadPoolExecutor(args.server_threads) as server:
+                submitted = [(time.perf_counter(), server.submit(fn, arg)) for fn, arg in jobs]
+                results = []
+                for queued_at, fut in submitted:
+                    route, status, _ = fut.result()
+                    results.append((route, status, time.perf_counter() - queued_at))
+            print(f"  offload={'on ' if offload else 'off'}")
+            for route in ("/login", "/schemes.json"):
+                lat = [t for r, _, t in results if r == route]
+                codes = {}
+                for r, status, _ in results:
+                    if r == route:
+                        codes[status] = codes.get(status, 0) + 1
+                print(f"    {route:14s} p50 {_percentile(lat, 50) * 1000:8.1f} ms   "
+                      f"p99 {_percentile(lat, 99) * 1000:8.1f} ms   status {codes}")
+        app.password_hasher.close()
+
+
+# -------------------- Reply storage --------------------
+INLINE_REPLY_SQL = "INSERT INTO searches (user_id, question, reply, category, intent, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def _replay_rows(n, seed=9):
+    """Chat log rows as chatbot_api produces them (all three languages), in batches of SEARCH_LOG_BATCH."""
+    rnd = random.Random(seed)
+    answered = []
+    for lang in app.REPLY_LANGS:
+        last_cat = None
+        for q in make_corpus(700, seed=seed):
+            category, intent = app.classify_message(app.normalize_message(q))
+            last_cat = category or last_cat
+            answered.append((q, app.lookup_reply(lang, category, intent, last_cat), category, intent))
+    start = datetime.datetime(2023, 1, 1)
+    batch = []
+    for i in range(n):
+        q, reply, category, intent = answered[rnd.randrange(len(answered))]
+        batch.append((1 + rnd.randrange(10_000), q, reply, category, intent,
+                      (start + datetime.timedelta(seconds=i)).isoformat()))
+        if len(batch) == app.SEARCH_LOG_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bench_reply_storage(args):
+    """Replay the same chat log into the schema before and after reply interning."""
+    migrations = app.MIGRATIONS
+    print(f"replaying {args.rows} searches in write-behind batches of {app.SEARCH_LOG_BATCH}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for layout in ("inline", "interned"):
+            path = os.path.join(tmpdir, f"{layout}.db")
+            app.MIGRATIONS = migrations if layout == "interned" else migrations[:3]  # schema before replies
+            pool = app.ConnectionPool(path)
+            conn = pool.acquire()
+            try:
+                app.init_db(conn)
+            finally:
+                app.MIGRATIONS = migrations
+            interner = app.ReplyInterner()
+            elapsed = 0.0  # insert time only, not generating the rows
+            for batch in _replay_rows(args.rows):
+                start = time.perf_counter()
+                if layout == "interned":
+                    batch = interner.rows(conn, batch)
+                with conn:
+                    conn.executemany(app.INSERT_SEARCH_SQL if layout == "interned" else INLINE_REPLY_SQL, batch)
+                elapsed += time.perf_counter() - start
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            user = 1 + random.Random(1).randrange(10_000)
+            history, _ = _timed(lambda: app.fetch_history_page(conn, user) if layout == "interned" else
+                                conn.execute("SELECT id, question, reply, timestamp FROM searches WHERE user_id = ? "
+                                             "ORDER BY timestamp DESC, id DESC LIMIT 21", (user,)).fetchall())
+            replies = conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] if layout == "interned" else "-"
+            pool.release(conn)
+            print(f"  {layout:8s} {args.rows / elapsed:9.0f} rows/s   db {os.path.getsize(path) / 1e6:8.1f} MB   "
+                  f"history page {history * 1000:.2f} ms   distinct replies {replies}")
+
+
+# -------------------- Search log --------------------
+def _scratch_pool(tmpdir):
+    pool = app.ConnectionPool(os.path.join(tmpdir, "bench.db"))
+    conn = pool.acquire()
+    app.init_db(conn)
+    pool.release(conn)
+    return pool
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def bench_search_log(args):
+    rows = [(1 + i % 1000, "student schemes", "Here are schemes for *student*", "student",
+             None, "2024-01-01T00:00:00") for i in range(args.rows)]
+    per_thread = len(rows) // args.threads
+
+    print(f"{len(rows)} rows from {args.threads} threads")
+    for mode in ("sync", "write-behind"):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pool = _scratch_pool(tmpdir)
+            writer = app.SearchLogWriter(pool, sync=(mode == "sync"))
+            latencies = []
+
+            def worker(chunk):
+                local = []
+                for row in chunk:
+                    start = time.perf_counter()
+                    writer.log(row)
+                    local.append(time.perf_counter() - start)
+                latencies.extend(local)
+
+            threads = [threading.Thread(target=worker, args=(rows[i * per_thread:(i + 1) * per_thread],))
+                       for i in range(args.threads)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            writer.flush()
+            elapsed = time.perf_counter() - start
+            writer.close()
+
+            print(f"  {mode:13s} {len(latencies) / elapsed:10.0f} rows/s   "
+                  f"caller p50 {statistics.median(latencies) * 1e6:8.1f} us   "
+                  f"p99 {_percentile(latencies, 99) * 1e6:8.1f} us   {writer.stats}")
+
+
+# -------------------- Bulk import / export --------------------
+def bench_import(args):
+    """signup()-style one-by-one inserts vs import_users, hashing inline vs across cores, streaming exports."""
+    pwhash = app.generate_password_hash("secret", method=app.PASSWORD_HASH_METHOD)
+    records = [{"name": f"Citizen {i}", "email": f"citizen{i}@{DOMAINS[i % len(DOMAINS)]}",
+                "phone": f"9{i:09d}", "password_hash": pwhash} for i in range(args.rows)]
+    records += records[:args.rows // 20]  # re-submitted rows
+    print(f"{len(records)} pre-hashed records ({args.rows // 20} repeats)")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for mode in ("one-by-one", "bulk"):
+            os.makedirs(os.path.join(tmpdir, mode))
+            pool = _scratch_pool(os.path.join(tmpdir, mode))
+            conn = pool.acquire()
+            start = time.perf_counter()
+            if mode == "bulk":
+                for stats in app.import_users(conn, records):
+                    pass
+                inserted = stats["inserted"]
+            else:
+                inserted = 0
+                for r in records:
+                    if conn.execute("SELECT id FROM users WHERE email = ?", (r["email"],)).fetchone():
+                        continue
+                    conn.execute("INSERT INTO users (name, email, email_domain, phone, password_hash, signup_date) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)",
+                                 (r["name"], r["email"], app.email_domain(r["email"]), r["phone"],
+                                  r["password_hash"], datetime.datetime.utcnow().isoformat()))
+                    conn.commit()
+                    inserted += 1
+            elapsed = time.perf_counter() - start
+            print(f"  insert {mode:10s} {len(records) / elapsed:8.0f} rows/s   {inserted} inserted")
+            if mode == "bulk":
+                seed_logins(conn, args.rows * 2, list(range(1, args.rows + 1)))
+                seed_searches(conn, args.rows * 5, list(range(1, args.rows + 1)))
+                for table in ("users", "logins", "searches"):
+                    fields = [c.strip() for c in app.EXPORT_TABLES[table][1].split(",")]
+                    for fmt in ("csv", "jsonl"):
+                        start = time.perf_counter()
+                        size = sum(len(chunk) for chunk in app.encode_rows(app.iter_table(conn, table), fields, fmt))
+                        elapsed = time.perf_counter() - start
+                        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                        print(f"  export {table:8s} {fmt:5s} {rows / elapsed:8.0f} rows/s   {size / 1e6:6.1f} MB")
+            pool.release(conn)
+
+    sample = [f"pw-{i}" for i in range(args.hash_sample)]
+    for offload in (False, True):
+        hasher = app.PasswordHasher(offload=offload)
+        hasher.hash_many(sample[:hasher.workers])  # start the workers outside the timing
+        start = time.perf_counter()
+        hasher.hash_many(sample)
+        elapsed = time.perf_counter() - start
+        print(f"  hash {hasher.method} {'across ' + str(hasher.workers) + ' workers' if offload else 'inline':16s} "
+              f"{len(sample) / elapsed:6.1f} hashes/s")
+
+
+# -------------------- Seeding --------------------
+DOMAINS = ["gmail.com", "yahoo.co.in", "outlook.com", "rediffmail.com", "ap.gov.in"]
+SEED_PASSWORD = "password123"
+
+
+def _insert_chunks(conn, sql, rows, batch=50_000):
+    """executemany over an iterator of rows, one transaction per batch."""
+    rows = iter(rows)
+    while True:
+        chunk = [r for _, r in zip(range(batch), rows)]
+        if not chunk:
+            return
+        with conn:
+            conn.executemany(sql, chunk)
+
+
+def seed_users(conn, n, seed=42, password_hash="x"):
+    """Insert n synthetic users with increasing signup dates."""
+    rnd = random.Random(seed)
+    start = datetime.datetime(2022, 1, 1)
+    start_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM users").fetchone()[0]
+
+    def rows():
+        for i in range(start_id + 1, start_id + n + 1):
+            domain = DOMAINS[rnd.randrange(len(DOMAINS))]
+            signup = start + datetime.timedelta(seconds=i * 30 + rnd.randrange(30))
+            yield (f"User {i}", f"user{i}@{domain}", domain, f"9{i:09d}", password_hash, signup.isoformat(), None)
+
+    _insert_chunks(conn, "INSERT INTO users (name, email, email_domain, phone, password_hash, signup_date, "
+                         "last_login) VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+
+
+def seed_logins(conn, n, user_ids, seed=43):
+    """Insert n login records spread over the given users."""
+    rnd = random.Random(seed)
+    start = datetime.datetime(2023, 1, 1)
+
+    def rows():
+        for i in range(n):
+            t = start + datetime.timedelta(seconds=i * 7 + rnd.randrange(7))
+            out = t + datetime.timedelta(minutes=rnd.randrange(1, 90))
+            yield (rnd.choice(user_ids), t.isoformat(), out.isoformat(), f"10.0.{rnd.randrange(256)}.{rnd.randrange(256)}")
+
+    _insert_chunks(conn, "INSERT INTO logins (user_id, login_time, logout_time, ip) VALUES (?, ?, ?, ?)", rows())
+
+
+def seed_searches(conn, n, user_ids, seed=44, step=3):
+    """Insert n chat log rows, `step` seconds apart, with replies produced by the real reply logic."""
+    rnd = random.Random(seed)
+    start = datetime.datetime(2023, 1, 1)
+    questions = make_corpus(2000, seed=seed)
+    answered = []
+    last_cat = None
+    for q in questions:
+        category, intent = app.classify_message(app.normalize_message(q))
+        last_cat = category or last_cat
+        answered.append((q, app.lookup_reply("en", category, intent, last_cat), category, intent))
+    interned = app.ReplyInterner().rows(conn, [(0, q, reply, c, i, "") for q, reply, c, i in answered])
+    answered = [(q, row[2], c, i) for (q, _, c, i), row in zip(answered, interned)]
+
+    def rows():
+        for i in range(n):
+            q, reply_id, category, intent = answered[rnd.randrange(len(answered))]
+            t = start + datetime.timedelta(seconds=i * step + rnd.randrange(step))
+            yield (rnd.choice(user_ids), q, reply_id, category, intent, t.isoformat())
+
+    _insert_chunks(conn, app.INSERT_SEARCH_SQL, rows())
+
+
+def bench_seed(args):
+    """Fill a database (mee_sahayam.db by default) with synthetic data."""
+    pool = _use_database(args.db)
+    conn = pool.acquire()
+    try:
+        pwhash = app.generate_password_hash(SEED_PASSWORD, method=app.password_hasher.method)
+        start = time.perf_counter()
+        seed_users(conn, args.users, password_hash=pwhash)
+        user_ids = [r[0] for r in conn.execute("SELECT id FROM users")]
+        seed_logins(conn, args.logins, user_ids)
+        seed_searches(conn, args.searches, user_ids)
+        total = args.users + args.logins + args.searches
+        elapsed = time.perf_counter() - start
+        print(f"seeded {args.db}: {args.users} users, {args.logins} logins, {args.searches} searches "
+              f"in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    finally:
+        pool.release(conn)
+
+
+# -------------------- Analytics rollups --------------------
+ANALYTICS_SCAN_SQL = """SELECT substr(timestamp, 1, 10) AS day, COALESCE(category, ''), COALESCE(intent, ''), COUNT(*)
+                        FROM searches GROUP BY 1, 2, 3"""
+LOGINS_SCAN_SQL = "SELECT substr(login_time, 1, 13), COUNT(*) FROM logins GROUP BY 1"
+
+
+def bench_analytics(args):
+    """Full scans vs rollup reads, trigger cost on inserts, and backfill of pre-existing rows."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = _use_database(os.path.join(tmpdir, "bench.db"))
+        conn = pool.acquire()
+        seed_users(conn, 1000)
+        user_ids = [r[0] for r in conn.execute("SELECT id FROM users")]
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                                "AND name LIKE '%rollup%'").fetchall()
+
+        # rows written before the rollups existed
+        with conn:
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        start = time.perf_counter()
+        seed_logins(conn, args.logins, user_ids)
+        seed_searches(conn, args.searches, user_ids)
+        plain = time.perf_counter() - start
+        with conn:
+            for _, sql in triggers:
+                conn.execute(sql)
+            conn.execute("UPDATE rollup_backfill SET done_id = 0, until_id = "
+                         "(SELECT COALESCE(MAX(id), 0) FROM searches) WHERE source = 'searches'")
+            conn.execute("UPDATE rollup_backfill SET done_id = 0, until_id = "
+                         "(SELECT COALESCE(MAX(id), 0) FROM logins) WHERE source = 'logins'")
+        rows = args.logins + args.searches
+        print(f"{args.searches} searches + {args.logins} logins")
+        print(f"  insert, no triggers     {rows / plain:10.0f} rows/s")
+
+        start = time.perf_counter()
+        for _ in app.backfill_rollups(conn, args.batch_size):
+            pass
+        print(f"  backfill                {time.perf_counter() - start:10.2f} s "
+              f"({args.batch_size} rows per transaction)")
+
+        start = time.perf_counter()
+        seed_logins(conn, args.logins // 10, user_ids, seed=53)
+        seed_searches(conn, args.searches // 10, user_ids, seed=54)
+        with_triggers = time.perf_counter() - start
+        print(f"  insert, with triggers   {rows // 10 / with_triggers:10.0f} rows/s")
+
+        scan, _ = _timed(lambda: (conn.execute(ANALYTICS_SCAN_SQL).fetchall(),
+                               conn.execute(LOGINS_SCAN_SQL).fetchall()), repeat=3)
+        rollup_rows = conn.execute("SELECT COUNT(*) FROM search_daily").fetchone()[0]
+        check = sorted(tuple(r) for r in conn.execute(ANALYTICS_SCAN_SQL))
+        rolled = sorted(tuple(r) for r in conn.execute("SELECT day, category, intent, count FROM search_daily"))
+        pool.release(conn)
+
+        client = flask_app.test_client()
+        endpoint, _ = _timed(lambda: client.get("/analytics?since=2000-01-01").status_code, repeat=3)
+        print(f"  full scan               {scan * 1000:10.1f} ms")
+        print(f"  /analytics (rollups)    {endpoint * 1000:10.1f} ms ({rollup_rows} rollup rows)")
+        print(f"  rollups match full scan: {check == rolled}")
+
+
+# -------------------- Archival --------------------
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) if os.path.isdir(path) else 0
+
+
+def bench_archive(args):
+    """Searches spread over a year; archive everything but the last `keep_days` days."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = _use_database(os.path.join(tmpdir, "bench.db"))
+        archive_dir = os.path.join(tmpdir, "archive")
+        conn = pool.acquire()
+        seed_users(conn, 1000)
+        user_ids = [r[0] for r in conn.execute("SELECT id FROM users")]
+        step = max(1, 365 * 86400 // args.searches)
+        seed_searches(conn, args.searches, user_ids, step=step)
+        newest = conn.execute("SELECT MAX(timestamp) FROM searches").fetchone()[0]
+        before = (datetime.datetime.fromisoformat(newest) - datetime.timedelta(days=args.keep_days)).isoformat()
+
+        def show(label, stats):
+            print(f"  {label:7s} {stats['rows']:9d} rows  {stats['db_bytes'] / 1e6:8.1f} MB  "
+                  f"(free {stats['free_bytes'] / 1e6:6.1f} MB)  scan {stats['scan_ms']:8.1f} ms  "
+                  f"history page {stats['history_page_ms']:6.2f} ms")
+
+        print(f"{args.searches} searches over 365 days, keep the last {args.keep_days} "
+              f"(auto_vacuum={conn.execute('PRAGMA auto_vacuum').fetchone()[0]})")
+        show("before", app.searches_table_stats(conn))
+        moved = 0
+        start = time.perf_counter()
+        for n, _ in app.archive_searches(conn, before, args.batch_size, archive_dir):
+            moved += n
+        elapsed = time.perf_counter() - start
+        show("moved", app.searches_table_stats(conn))
+        start = time.perf_counter()
+        freed = app.incremental_vacuum(conn, pause=0)
+        vacuum = time.perf_counter() - start
+        show("vacuum", app.searches_table_stats(conn))
+        pool.release(conn)
+        print(f"  archived {moved} rows in {elapsed:.1f}s ({moved / elapsed:.0f} rows/s, {args.batch_size} per batch) "
+              f"into {len(os.listdir(archive_dir))} monthly files, {_dir_bytes(archive_dir) / 1e6:.1f} MB")
+        print(f"  incremental vacuum released {freed} pages in {vacuum:.2f}s")
+
+
+def _timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# -------------------- Admin user listing --------------------
+def bench_all_users(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = _scratch_pool(tmpdir)
+        conn = pool.acquire()
+        start = time.perf_counter()
+        seed_users(conn, args.users)
+        print(f"seeded {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        def legacy():
+            rows = conn.execute(
+                "SELECT id, name, email, phone, signup_date, last_login FROM users ORDER BY signup_date ASC"
+            ).fetchall()
+            counts = {}
+            for r in rows:
+                em = r["email"]
+                dom = em.split("@", 1)[1] if "@" in em else ""
+                counts[dom] = counts.get(dom, 0) + 1
+            return len(rows)
+
+        mid = conn.execute("SELECT signup_date, id FROM users ORDER BY id LIMIT 1 OFFSET ?",
+                           (args.users // 2,)).fetchone()
+        t_legacy, _ = _timed(legacy, repeat=1)
+        t_first, _ = _timed(lambda: app.fetch_users_page(conn, None, args.page_size))
+        t_mid, _ = _timed(lambda: app.fetch_users_page(conn, tuple(mid), args.page_size))
+        t_export, n = _timed(lambda: sum(1 for _ in app.iter_users(conn)), repeat=1)
+
+        print(f"  legacy fetchall + domain count   {t_legacy * 1000:10.1f} ms   "
+              f"peak {_peak_memory(legacy) / 2**20:8.1f} MiB")
+        print(f"  keyset page (first, {args.page_size:>4})        {t_first * 1000:10.3f} ms")
+        print(f"  keyset page (middle, {args.page_size:>4})       {t_mid * 1000:10.3f} ms")
+        print(f"  streaming walk of {n} rows  {t_export * 1000:10.1f} ms   "
+              f"peak {_peak_memory(lambda: sum(1 for _ in app.iter_users(conn))) / 2**20:8.1f} MiB")
+        pool.release(conn)
+
+
+# -------------------- Route load test --------------------
+class TestClientDriver:
+    """Requests through Flask's test client (no sockets, measures the app itself)."""
+
+    def __init__(self):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, form=None, json=None):
+        return self.client.open(path, method=method, data=form, json=json).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _QuietHandler(werkzeug.serving.WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _UvicornServer:
+    """uvicorn bound to an already-open socket, with serve_forever()/shutdown() like werkzeug's servers."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.server = uvicorn.Server(uvicorn.Config(app.AsgiApp(flask_app), log_level="warning", access_log=False,
+                                                    lifespan="on"))
+
+    def serve_forever(self):
+        self.server.run(sockets=[self.sock])
+
+    def shutdown(self):
+        self.server.should_exit = True
+
+
+def _start_server(kind, port=0):
+    """A threaded werkzeug server ("wsgi") or uvicorn ("asgi") on 127.0.0.1; returns (server, port)."""
+    if kind == "wsgi":
+        server = werkzeug.serving.make_server("127.0.0.1", port, flask_app, threaded=True,
+                                              request_handler=_QuietHandler)
+        return server, server.server_port
+    if uvicorn is None:
+        raise SystemExit("the asgi server needs uvicorn: pip install uvicorn")
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(1024)
+    return _UvicornServer(sock), sock.getsockname()[1]
+
+
+class HttpDriver:
+    """Requests over HTTP to a local threaded WSGI server, with a cookie jar per client."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, form=None, json=None):
+        headers, body = {}, None
+        if form is not None:
+            body = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json is not None:
+            body = _json.dumps(json).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def _route_requests(rnd, emails, messages):
+    """name -> callable(driver) issuing one request for that route."""
+    categories = list(app.schemes_db)
+    return {
+        "login": lambda d: d.request("POST", "/login", form={"email": rnd.choice(emails), "password": SEED_PASSWORD}),
+        "chatbot_api": lambda d: d.request("POST", "/chatbot_api", json={"message": rnd.choice(messages)}),
+        "chatbot": lambda d: d.request("GET", "/chatbot"),
+        "account": lambda d: d.request("GET", "/account"),
+        "all_users": lambda d: d.request("GET", "/all_users"),
+        "category": lambda d: d.request("GET", "/category/" + urllib.parse.quote(rnd.choice(categories))),
+    }
+
+
+def _login_driver(driver, conn, rnd):
+    """Log a driver in as a random seeded user so session-guarded routes do real work."""
+    email, = conn.execute("SELECT email FROM users WHERE id >= ? ORDER BY id LIMIT 1",
+                          (rnd.randint(1, conn.execute("SELECT MAX(id) FROM users").fetchone()[0]),)).fetchone()
+    status = driver.request("POST", "/login", form={"email": email, "password": SEED_PASSWORD})
+    if status != 302:
+        raise SystemExit(f"login as {email} failed ({status}); seed with `python bench.py seed` first")
+
+
+def _summarize(latencies, statuses, elapsed):
+    codes = {}
+    for s in statuses:
+        codes[str(s)] = codes.get(str(s), 0) + 1
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for s in statuses if s >= 500),
+        "status": codes,
+        "throughput_rps": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+def bench_load(args):
+    pool = _use_database(args.db)
+    _use_checkout_templates()
+    conn = pool.acquire()
+    user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    if not user_count:
+        raise SystemExit(f"{args.db} has no users; run `python bench.py seed --db {args.db}` first")
+    emails = [r[0] for r in conn.execute("SELECT email FROM users ORDER BY RANDOM() LIMIT 1000")]
+    routes = _route_requests(random.Random(5), emails, make_corpus(1000))
+    wanted = list(routes) if args.routes == "all" else args.routes.split(",")
+
+    server = None
+    if args.server in ("wsgi", "asgi"):
+        server, port = _start_server(args.server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{port}"
+
+        def make_driver():
+            return HttpDriver(base_url)
+    else:
+        make_driver = TestClientDriver
+
+    rnd = random.Random(6)
+    drivers = []
+    for _ in range(args.concurrency):
+        d = make_driver()
+        _login_driver(d, conn, rnd)
+        drivers.append(d)
+    pool.release(conn)
+
+    results = {
+        "meta": {
+            "started": datetime.datetime.utcnow().isoformat(),
+            "git_rev": _git_rev(),
+            "db": os.path.abspath(args.db),
+            "users": user_count,
+            "server": args.server,
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "routes": {},
+    }
+    print(f"{args.server}, {args.concurrency} clients, {args.requests} requests/route, {user_count} users")
+    for name in wanted:
+        fn = routes[name]
+        for d in drivers[:1]:
+            for _ in range(min(20, args.requests)):
+                fn(d)  # warm up caches and connections
+        per_client = max(1, args.requests // args.concurrency)
+
+        def run(driver):
+            lat, codes = [], []
+            for _ in range(per_client):
+                start = time.perf_counter()
+                codes.append(fn(driver))
+                lat.append(time.perf_counter() - start)
+            return lat, codes
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            outcomes = list(ex.map(run, drivers))
+        elapsed = time.perf_counter() - start
+        latencies = [t for lat, _ in outcomes for t in lat]
+        statuses = [c for _, codes in outcomes for c in codes]
+        summary = results["routes"][name] = _summarize(latencies, statuses, elapsed)
+        print(f"  {name:12s} {summary['throughput_rps']:9.0f} req/s   p50 {summary['p50_ms']:8.2f}   "
+              f"p95 {summary['p95_ms']:8.2f}   p99 {summary['p99_ms']:8.2f} ms   status {summary['status']}")
+
+    app.app_state(flask_app).search_log.flush()
+    if server is not None:
+        server.shutdown()
+    if args.out:
+        with open(args.out, "w") as f:
+            _json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app.APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_compare(args):
+    """Compare two `load --out` files; exit 1 if any route regressed past the threshold."""
+    with open(args.baseline) as f:
+        base = _json.load(f)
+    with open(args.candidate) as f:
+        cand = _json.load(f)
+    regressed = []
+    print(f"{args.baseline} ({base['meta'].get('git_rev')}) -> {args.candidate} ({cand['meta'].get('git_rev')})")
+    for name, new in cand["routes"].items():
+        old = base["routes"].get(name)
+        if old is None:
+            continue
+        row = [name]
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            worse = -change if key == "throughput_rps" else change
+            if worse > args.threshold:
+                regressed.append(f"{name}.{key}")
+            row.append(f"{key} {old[key]:.2f} -> {new[key]:.2f} ({change:+.1f}%)")
+        print("  " + "   ".join(row))
+    if regressed:
+        print(f"regressions over {args.threshold}%: {', '.join(regressed)}")
+        raise SystemExit(1)
+
+
+# -------------------- Concurrency scaling (threaded WSGI vs ASGI) --------------------
+def bench_serve(args):
+    """Serve the app from this process for bench_concurrency; prints "ready PORT" once listening."""
+    _use_database(args.db)
+    _use_checkout_templates()
+    server, port = _start_server(args.server, args.port)
+    print("ready", port, flush=True)
+    server.serve_forever()
+
+
+def _proc_status(pid):
+    """(threads, RSS in MB) of a running process, from /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024
+
+
+def bench_concurrency(args):
+    conn = sqlite3.connect(args.db)
+    if not conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+        raise SystemExit(f"{args.db} has no users; run `python bench.py seed --db {args.db}` first")
+    levels = [int(c) for c in args.levels.split(",")]
+    messages = make_corpus(1000)
+    rnd = random.Random(7)
+    routes = {
+        "chatbot_api": lambda d: d.request("POST", "/chatbot_api", json={"message": rnd.choice(messages)}),
+        "chatbot": lambda d: d.request("GET", "/chatbot"),
+    }
+    print(f"{args.requests} requests per level; each server is one process, the clients are threads here")
+    for kind in ("wsgi", "asgi"):
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--server", kind,
+                                 "--db", args.db], stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(proc.stdout.readline().split()[1])
+            drivers = [HttpDriver(f"http://127.0.0.1:{port}") for _ in range(max(levels))]
+            for d in drivers:
+                _login_driver(d, conn, rnd)
+            for name, fn in routes.items():
+                for c in levels:
+                    per_client = max(1, args.requests // c)
+                    peak_threads = [0]
+                    done = threading.Event()
+
+                    def sample():
+                        while not done.wait(0.02):
+                            peak_threads[0] = max(peak_threads[0], _proc_status(proc.pid)[0])
+
+                    def run(driver):
+                        lat, codes = [], []
+                        for _ in range(per_client):
+                            start = time.perf_counter()
+                            codes.append(fn(driver))
+                            lat.append(time.perf_counter() - start)
+                        return lat, codes
+
+                    sampler = threading.Thread(target=sample, daemon=True)
+                    sampler.start()
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(c) as ex:
+                        outcomes = list(ex.map(run, drivers[:c]))
+                    elapsed = time.perf_counter() - start
+                    done.set()
+                    sampler.join()
+                    summary = _summarize([t for lat, _ in outcomes for t in lat],
+                                         [s for _, codes in outcomes for s in codes], elapsed)
+                    print(f"  {kind} {name:12s} c={c:<4d} {summary['throughput_rps']:7.0f} req/s   "
+                          f"p50 {summary['p50_ms']:8.2f}   p99 {summary['p99_ms']:8.2f} ms   "
+                          f"threads {peak_threads[0]:4d}   rss {_proc_status(proc.pid)[1]:6.1f} MB   "
+                          f"status {summary['status']}")
+        finally:
+            proc.terminate()
+            proc.wait()
+    conn.close()
+
+
+# -------------------- Alert streams (SSE) --------------------
+def _asgi_stream_clients(asgi, path, n, state):
+    """`n` SSE clients driven straight through the ASGI app (no sockets); they hang up when state["done"] is set."""
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": path,
+             "root_path": "", "query_string": b"", "headers": [], "server": ("127.0.0.1", 80),
+             "client": ("127.0.0.1", 1)}
+
+    async def client():
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await state["done"].wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            body = message.get("body", b"")
+            state["bytes"] += len(body)
+            if b"event: alert" in body:
+                state["alerts"] += 1
+                if state["alerts"] == n:
+                    state["all_alerted"].set()
+
+        await asgi(scope, receive, send)
+
+    return [asyncio.ensure_future(client()) for _ in range(n)]
+
+
+def _publish_one(broadcaster, category):
+    """Add one alert to the category, as a catalog edit would, and publish it."""
+    alerts = app.schemes_db[category].get("alerts", [])
+    return broadcaster.sync(alerts + [f"bench alert {time.time_ns()}"])
+
+
+def bench_alerts(args):
+    _use_scratch_database()
+    app.SSE_HEARTBEAT = args.heartbeat
+    category = next(iter(app.schemes_db))
+    path = "/category/" + urllib.parse.quote(category) + "/alerts/stream"
+    broadcaster = app.alert_hub.broadcaster(category)
+    print(f"{args.subscribers} idle subscribers on '{category}', heartbeat every {args.heartbeat}s")
+
+    async def run_asgi():
+        n = args.subscribers
+        state = {"bytes": 0, "alerts": 0, "done": asyncio.Event(), "all_alerted": asyncio.Event()}
+        rss0 = _proc_status(os.getpid())[1]
+        tracemalloc.start()
+        tasks = _asgi_stream_clients(app.AsgiApp(flask_app), path, n, state)
+        while len(broadcaster) < n:
+            await asyncio.sleep(0.05)
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rss = _proc_status(os.getpid())[1] - rss0
+
+        cpu = time.process_time()
+        await asyncio.sleep(args.idle)
+        idle_cpu = time.process_time() - cpu
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        _publish_one(broadcaster, category)
+        await state["all_alerted"].wait()
+        fanout_wall, fanout_cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+        state["done"].set()
+        await asyncio.gather(*tasks)
+        per_10k = 10_000 / n
+        print(f"  asgi     {rss * per_10k:7.1f} MB RSS / 10k   (python heap {heap / 1e6 * per_10k:6.1f} MB)   "
+              f"idle cpu {idle_cpu / args.idle * 1000 * per_10k:6.1f} ms/s per 10k   "
+              f"fan-out of one alert {fanout_wall * 1000:7.1f} ms wall, {fanout_cpu * 1000:7.1f} ms cpu")
+
+    asyncio.run(run_asgi())
+
+
+# -------------------- Account summary --------------------
+def legacy_account_summary(db, user_id):
+    """The four sequential queries /account ran before fetch_account_summary."""
+    cur = db.cursor()
+    cur.execute("SELECT id, name, email, email_domain, phone, signup_date, last_login FROM users WHERE id = ?",
+                (user_id,))
+    user = cur.fetchone()
+    domain = user["email_domain"] if user else ""
+    family_count = 1
+    if domain:
+        cur.execute("SELECT count FROM domain_counts WHERE domain = ?", (domain,))
+        row = cur.fetchone()
+        family_count = row["count"] if row else 1
+    cur.execute("SELECT value FROM counters WHERE name = 'users'")
+    total_users = cur.fetchone()["value"]
+    cur.execute("SELECT login_time, logout_time, ip FROM logins WHERE user_id = ? ORDER BY login_time DESC LIMIT 10",
+                (user_id,))
+    return {"user": user, "domain": domain, "family_count": family_count, "total_users": total_users,
+            "login_history": cur.fetchall()}
+
+
+def _as_plain(summary):
+    return {**summary, "user": dict(summary["user"]) if summary["user"] else None,
+            "login_history": [dict(r) for r in summary["login_history"]]}
+
+
+def bench_account(args):
+    """/account summary latency: four queries vs one query vs the per-user cache under login churn."""
+    pool = _use_database(args.db)
+    conn = pool.acquire()
+    try:
+        users = conn.execute("SELECT value FROM counters WHERE name = 'users'").fetchone()[0]
+        logins = conn.execute("SELECT MAX(id) FROM logins").fetchone()[0] or 0
+        if users < 1000:
+            raise SystemExit(f"{args.db} has {users} users; run `python bench.py seed --db {args.db}` first")
+        max_id = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+        rnd = random.Random(11)
+        # a few thousand active accounts revisited many times, like the users actually logged in
+        active = [rnd.randint(1, max_id) for _ in range(args.active)]
+        visits = [rnd.choice(active) for _ in range(args.visits)]
+        print(f"{users} users, ~{logins} logins; {args.visits} visits over {args.active} active accounts")
+
+        for uid in active[:200]:
+            before, after = _as_plain(legacy_account_summary(conn, uid)), app.fetch_account_summary(conn, uid)
+            if before != after:
+                raise SystemExit(f"summaries differ for user {uid}:\n{before}\n{after}")
+
+        def run(name, fn):
+            for uid in visits[:500]:  # warm SQLite's page cache the same way for every variant
+                fn(uid)
+            lat = []
+            start = time.perf_counter()
+            for uid in visits:
+                t = time.perf_counter()
+                fn(uid)
+                lat.append(time.perf_counter() - t)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:34s} {len(lat) / elapsed:8.0f}/s   p50 {_percentile(lat, 50) * 1e3:6.3f}   "
+                  f"p99 {_percentile(lat, 99) * 1e3:6.3f}   max {max(lat) * 1e3:7.3f} ms")
+
+        run("4 queries (before)", lambda uid: legacy_account_summary(conn, uid))
+        run("1 query", lambda uid: app.fetch_account_summary(conn, uid))
+
+        cache = app.AccountSummaryCache(max_entries=app.ACCOUNT_CACHE_MAX_ENTRIES)
+        churn = random.Random(13)
+
+        def cached(uid):
+            # the writes that invalidate: this user logging in/out, anybody signing up
+            if churn.random() < args.login_rate:
+                cache.invalidate_user(uid)
+            if churn.random() < args.signup_rate:
+                cache.invalidate_counts(churn.choice(DOMAINS))
+            summary = cache.get(uid)
+            if summary is None:
+                summary = app.fetch_account_summary(conn, uid)
+                cache.put(uid, summary)
+            return summary
+
+        run(f"cached ({args.login_rate:.0%} login, {args.signup_rate:.0%} signup)", cached)
+        hits, misses = cache.stats["hits"], cache.stats["misses"]
+        print(f"  cache: {hits / (hits + misses):.1%} hits, {len(cache)} entries")
+    finally:
+        pool.release(conn)
+
+
+# -------------------- Worker cold start --------------------
+# Run in a fresh interpreter per worker. Works against checkouts from before
+# create_app() too, where importing the module built the app and ran init_db().
+STARTUP_WORKER = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app() if hasattr(app, "create_app") else app.app
+t2 = time.perf_counter()
+status = flask_app.test_client().get("/schemes.json").status_code
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create": t2 - t1, "first_request": t3 - t2, "status": status,
+                  "ready_at": time.time()}))
+"""
+
+
+def bench_startup(args):
+    """Start `--workers` fresh interpreters at once against one database, like a pre-fork server booting."""
+    app_dir = os.path.abspath(args.app_dir)
+    env = dict(os.environ, PYTHONPATH=app_dir)
+    print(f"{args.workers} workers x {args.rounds} rounds, app from {app_dir}"
+          + (f", write lock held for {args.hold_write_lock}s" if args.hold_write_lock else ""))
+    walls, timings = [], []
+    for _ in range(args.rounds):
+        writer = None
+        if args.hold_write_lock:
+            # another process mid-write (an import, a backfill) while the workers boot
+            writer = sqlite3.connect(os.path.join(app_dir, "mee_sahayam.db"), isolation_level=None)
+            writer.execute("BEGIN IMMEDIATE")
+        start = time.time()
+        procs = [subprocess.Popen([sys.executable, "-c", STARTUP_WORKER], cwd=app_dir, env=env,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+        if writer is not None:
+            time.sleep(args.hold_write_lock)
+            writer.execute("COMMIT")
+            writer.close()
+        ready = []
+        for proc in procs:
+            out, _ = proc.communicate()
+            if proc.returncode:
+                raise SystemExit(f"worker exited with {proc.returncode}")
+            timings.append(_json.loads(out.strip().splitlines()[-1]))
+            ready.append(timings[-1]["ready_at"])
+        walls.append(max(ready) - start)
+    for key in ("import", "create", "first_request"):
+        values = [t[key] for t in timings]
+        print(f"  {key:14s} mean {statistics.fmean(values) * 1000:7.1f}   max {max(values) * 1000:7.1f} ms")
+    print(f"  all {args.workers} workers up: mean {statistics.fmean(walls) * 1000:7.1f} ms per round "
+          f"(process start included)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("matcher", help="category/intent detection microbenchmark")
+    p.add_argument("--messages", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_matcher)
+
+    p = sub.add_parser("search_log", help="per-row commits vs write-behind batching")
+    p.add_argument("--rows", type=int, default=20_000)
+    p.add_argument("--threads", type=int, default=4)
+    p.set_defaults(func=bench_search_log)
+
+    p = sub.add_parser("all_users", help="full-table listing vs keyset pages and streaming export")
+    p.add_argument("--users", type=int, default=1_000_000)
+    p.add_argument("--page-size", type=int, default=app.USERS_PAGE_SIZE)
+    p.set_defaults(func=bench_all_users)
+
+    p = sub.add_parser("replies", help="reply table + LRU vs rebuilding replies per message")
+    p.add_argument("--messages", type=int, default=200_000)
+    p.add_argument("--distinct", type=int, default=5_000)
+    p.set_defaults(func=bench_replies)
+
+    p = sub.add_parser("reply_storage", help="database size and insert rate with replies inline vs interned")
+    p.add_argument("--rows", type=int, default=10_000_000)
+    p.set_defaults(func=bench_reply_storage)
+
+    p = sub.add_parser("hashing", help="login surge with and without the hashing process pool")
+    p.add_argument("--logins", type=int, default=200)
+    p.add_argument("--cheap", type=int, default=2000)
+    p.add_argument("--server-threads", type=int, default=8)
+    p.set_defaults(func=bench_hashing)
+
+    p = sub.add_parser("scheme_search", help="FTS5 scheme search latency and incremental sync")
+    p.add_argument("--schemes", type=int, default=10_000)
+    p.add_argument("--queries", type=int, default=5_000)
+    p.set_defaults(func=bench_scheme_search)
+
+    p = sub.add_parser("sessions", help="cookie vs server-side session bytes and CPU per request")
+    p.add_argument("--messages", type=int, default=5_000)
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser("chat_batch", help="single-message chat API vs the batch endpoint")
+    p.add_argument("--messages", type=int, default=5_000)
+    p.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10, 50, 100])
+    p.set_defaults(func=bench_chat_batch)
+
+    p = sub.add_parser("pages", help="page cache: render CPU and bytes per request for a browsing session")
+    p.add_argument("--sessions", type=int, default=300)
+    p.add_argument("--revisits", type=int, default=3)
+    p.set_defaults(func=bench_pages)
+
+    p = sub.add_parser("import", help="bulk user import vs one-by-one signups, and streaming exports")
+    p.add_argument("--rows", type=int, default=50_000)
+    p.add_argument("--hash-sample", type=int, default=64, help="passwords hashed with PASSWORD_HASH_METHOD")
+    p.set_defaults(func=bench_import)
+
+    p = sub.add_parser("seed", help="fill a database with synthetic users, logins and searches")
+    p.add_argument("--db", default=app.DB_PATH)
+    p.add_argument("--users", type=int, default=10_000)
+    p.add_argument("--logins", type=int, default=50_000)
+    p.add_argument("--searches", type=int, default=200_000)
+    p.set_defaults(func=bench_seed)
+
+    p = sub.add_parser("analytics", help="rollup reads vs full scans, trigger cost and backfill")
+    p.add_argument("--searches", type=int, default=500_000)
+    p.add_argument("--logins", type=int, default=200_000)
+    p.add_argument("--batch-size", type=int, default=app.ROLLUP_BACKFILL_BATCH)
+    p.set_defaults(func=bench_analytics)
+
+    p = sub.add_parser("archive", help="move old searches to monthly archives; size and scan time before/after")
+    p.add_argument("--searches", type=int, default=500_000)
+    p.add_argument("--keep-days", type=int, default=60)
+    p.add_argument("--batch-size", type=int, default=app.ARCHIVE_BATCH)
+    p.set_defaults(func=bench_archive)
+
+    p = sub.add_parser("load", help="drive every route concurrently and report latency percentiles")
+    p.add_argument("--db", default=app.DB_PATH)
+    p.add_argument("--routes", default="all", help="comma-separated subset of: "
+                   "login,chatbot_api,chatbot,account,all_users,category")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--requests", type=int, default=2000, help="requests per route")
+    p.add_argument("--server", choices=("testclient", "wsgi", "asgi"), default="testclient")
+    p.add_argument("--out", help="write JSON results here")
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("concurrency", help="chat routes at rising concurrency: threaded WSGI vs ASGI server")
+    p.add_argument("--db", default=app.DB_PATH)
+    p.add_argument("--levels", default="1,8,32,128", help="comma-separated client counts")
+    p.add_argument("--requests", type=int, default=2000, help="requests per route and level")
+    p.set_defaults(func=bench_concurrency)
+
+    p = sub.add_parser("serve", help="serve the app for `concurrency` (internal)")
+    p.add_argument("--db", default=app.DB_PATH)
+    p.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi")
+    p.add_argument("--port", type=int, default=0)
+    p.set_defaults(func=bench_serve)
+
+    p = sub.add_parser("alerts", help="memory and CPU of idle alert stream subscribers, and alert fan-out time")
+    p.add_argument("--subscribers", type=int, default=10_000)
+    p.add_argument("--heartbeat", type=float, default=1.0, help="seconds between heartbeats")
+    p.add_argument("--idle", type=float, default=5.0, help="seconds of idle time measured")
+    p.set_defaults(func=bench_alerts)
+
+    p = sub.add_parser("startup", help="cold start of concurrently booting workers: import, create_app, first request")
+    p.add_argument("--app-dir", default=app.APP_DIR, help="checkout to start (its own database is used)")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--hold-write-lock", type=float, default=0.0, metavar="SECONDS",
+                   help="keep a write transaction open this long while the workers start")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("account", help="/account summary: four queries vs one, and the per-user cache")
+    p.add_argument("--db", default=app.DB_PATH)
+    p.add_argument("--visits", type=int, default=50_000)
+    p.add_argument("--active", type=int, default=5000, help="distinct accounts visited")
+    p.add_argument("--login-rate", type=float, default=0.05, help="visits preceded by that user's login")
+    p.add_argument("--signup-rate", type=float, default=0.01, help="visits preceded by someone's signup")
+    p.set_defaults(func=bench_account)
+
+    p = sub.add_parser("compare", help="diff two load results; exit 1 on regression")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    p.set_defaults(func=bench_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
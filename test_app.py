@@ -0,0 +1,488 @@
+import asyncio
+import gzip
+import io
+import json
+import sqlite3
+import sys
+
+import jinja2
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app
+
+
+@pytest.fixture
+def client(tmp_path):
+    flask_app = app.create_app({"DATABASE": str(tmp_path / "test.db"), "MIGRATE_ON_START": True,
+                                "SESSION_BACKEND": "cookie"})
+    return flask_app.test_client()
+
+
+def ask(client, message):
+    response = client.post("/chatbot_api", json={"message": message})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+# ---- App factory ----
+def test_each_app_keeps_its_own_database(tmp_path):
+    first = app.create_app({"DATABASE": str(tmp_path / "a.db"), "MIGRATE_ON_START": True})
+    second = app.create_app({"DATABASE": str(tmp_path / "b.db"), "MIGRATE_ON_START": True,
+                             "SESSION_BACKEND": "memory"})
+    with first.app_context():
+        assert app.get_db().execute("PRAGMA database_list").fetchone()["file"].endswith("a.db")
+    with second.app_context():
+        assert app.get_db().execute("PRAGMA database_list").fetchone()["file"].endswith("b.db")
+    assert isinstance(app.app_state(first).session_store, app.SqliteSessionStore)
+    assert isinstance(app.app_state(second).session_store, app.MemorySessionStore)
+
+
+# ---- Schema migrations ----
+def apply_migrations(conn, upto):
+    for version in range(upto + 1):
+        for statement in app.MIGRATIONS[version]:
+            conn.execute(statement)
+    conn.commit()
+
+
+def test_migrate_new_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    latest = len(app.MIGRATIONS) - 1
+    assert app.schema_version(conn) == -1
+    assert app.migrate_db(conn) == list(range(latest + 1))
+    assert app.schema_version(conn) == latest
+    assert app.migrate_db(conn) == []
+
+
+def test_migrate_takes_over_from_legacy_user_version(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    apply_migrations(conn, 3)
+    conn.execute("PRAGMA user_version = 3")
+    conn.execute("INSERT INTO searches (user_id, question, reply, category, intent, timestamp) "
+                 "VALUES (1, 'farmer', 'Here are schemes', 'farmer', NULL, '2026-01-01T10:00:00')")
+    conn.commit()
+    assert app.schema_version(conn) == 3
+
+    assert app.migrate_db(conn) == [4]
+    assert [v for v, in conn.execute("SELECT version FROM schema_version ORDER BY version")] == [3, 4]
+    # version 4 moved reply text into `replies`; the search_log view joins it back
+    assert conn.execute("SELECT question, reply FROM search_log").fetchall() == [("farmer", "Here are schemes")]
+    assert conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] == 1
+
+
+# ---- Bulk import / export ----
+USER_RECORDS = [
+    {"name": "Asha", "email": "Asha@Gmail.com", "phone": "900", "password": "pw1", "signup_date": "2026-01-02T03:04:05"},
+    {"name": "Ravi, Jr.", "email": "ravi@ap.gov.in", "phone": "901", "password": "pw2",
+     "signup_date": "2026-01-03T00:00:00"},
+    {"name": "Asha again", "email": "asha@gmail.com", "phone": "902", "password": "pw3"},
+    {"name": "No phone", "email": "np@gmail.com", "phone": "", "password": "pw4"},
+    {"name": "Lakshmi \u0c32", "email": "lak@yahoo.com", "phone": "903", "password_hash": "pbkdf2:sha256:1000$s$h",
+     "signup_date": "2026-01-04T00:00:00"},
+]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_import_then_export_round_trip(fmt, pooled_conn):
+    hasher = app.PasswordHasher("pbkdf2:sha256:1000", offload=False)
+    fields = ["name", "email", "phone", "password", "password_hash", "signup_date"]
+    source = "".join(app.encode_rows(([r.get(f, "") for f in fields] for r in USER_RECORDS), fields, fmt))
+    records = app.read_user_records(io.StringIO(source, newline=""), fmt)
+    stats = list(app.import_users(pooled_conn, records, batch_size=2, hasher=hasher))[-1]
+    assert {k: stats[k] for k in ("read", "inserted", "existing", "duplicate", "invalid")} == {
+        "read": 5, "inserted": 3, "existing": 1, "duplicate": 0, "invalid": 1}
+    stored = dict(pooled_conn.execute("SELECT email, password_hash FROM users"))
+    assert hasher.check(stored["asha@gmail.com"], "pw1")
+    assert stored["lak@yahoo.com"] == "pbkdf2:sha256:1000$s$h"
+
+    fields = [c.strip() for c in app.USER_LIST_COLUMNS.split(",")]
+    exported = "".join(app.encode_rows(app.iter_table(pooled_conn, "users", batch_size=2), fields, fmt, batch_size=2))
+    users = list(app.read_user_records(io.StringIO(exported, newline=""), fmt))
+    assert [(u["name"], u["email"], u["phone"], u["signup_date"]) for u in users] == [
+        ("Asha", "asha@gmail.com", "900", "2026-01-02T03:04:05"),
+        ("Ravi, Jr.", "ravi@ap.gov.in", "901", "2026-01-03T00:00:00"),
+        ("Lakshmi \u0c32", "lak@yahoo.com", "903", "2026-01-04T00:00:00"),
+    ]
+    assert list(app.import_users(pooled_conn, users, hasher=hasher))[-1]["invalid"] == 3  # exports carry no passwords
+
+
+# ---- Analytics rollups ----
+def rollup_counts(conn):
+    return (dict(((day, category, intent), count) for day, category, intent, count
+                 in conn.execute("SELECT day, category, intent, count FROM search_daily")),
+            dict(conn.execute("SELECT hour, count FROM login_hourly")))
+
+
+def test_rollup_triggers_count_new_rows(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    app.migrate_db(conn)
+    conn.executemany("INSERT INTO searches (user_id, question, category, intent, timestamp) VALUES (1, 'q', ?, ?, ?)",
+                     [("farmer", None, "2026-03-01T09:00:00"), ("farmer", None, "2026-03-01T18:00:00"),
+                      (None, "amount", "2026-03-01T18:05:00"), (None, None, "2026-03-02T07:00:00")])
+    conn.executemany("INSERT INTO logins (user_id, login_time) VALUES (1, ?)",
+                     [("2026-03-01T09:10:00",), ("2026-03-01T09:50:00",), ("2026-03-01T10:00:00",)])
+    conn.commit()
+    assert rollup_counts(conn) == (
+        {("2026-03-01", "farmer", ""): 2, ("2026-03-01", "", "amount"): 1, ("2026-03-02", "", ""): 1},
+        {"2026-03-01T09": 2, "2026-03-01T10": 1},
+    )
+
+
+def test_backfill_adds_older_rows_once(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    apply_migrations(conn, 2)
+    conn.execute("PRAGMA user_version = 2")
+    conn.executemany("INSERT INTO searches (user_id, question, category, timestamp) VALUES (1, 'q', ?, ?)",
+                     [("farmer", "2026-03-01T09:00:00")] * 3 + [("student", "2026-03-02T09:00:00")] * 2)
+    conn.executemany("INSERT INTO logins (user_id, login_time) VALUES (1, ?)", [("2026-03-01T09:10:00",)] * 3)
+    conn.commit()
+    app.migrate_db(conn)
+    conn.execute("INSERT INTO searches (user_id, question, category, timestamp) "
+                 "VALUES (1, 'q', 'farmer', '2026-03-01T10:00:00')")
+    conn.commit()
+    assert rollup_counts(conn)[0] == {("2026-03-01", "farmer", ""): 1}
+
+    # stopped after one batch, then resumed from the stored watermark
+    next(app.backfill_rollups(conn, batch_size=2))
+    assert list(app.backfill_rollups(conn, batch_size=2)) == [("searches", 4, 5), ("searches", 5, 5),
+                                                              ("logins", 2, 3), ("logins", 3, 3)]
+    assert list(app.backfill_rollups(conn)) == []
+    assert rollup_counts(conn) == ({("2026-03-01", "farmer", ""): 4, ("2026-03-02", "student", ""): 2},
+                                   {"2026-03-01T09": 3})
+    conn.row_factory = sqlite3.Row
+    assert all(status["complete"] for status in app.rollup_backfill_status(conn).values())
+
+
+# ---- Archival ----
+@pytest.fixture
+def pooled_conn(tmp_path):
+    conn = app.ConnectionPool(str(tmp_path / "test.db")).acquire()
+    app.migrate_db(conn)
+    return conn
+
+
+def log_searches(conn, rows):
+    with conn:
+        conn.executemany(app.INSERT_SEARCH_SQL, app.ReplyInterner().rows(conn, rows))
+
+
+def test_archive_moves_old_searches_into_monthly_files(pooled_conn, tmp_path):
+    log_searches(pooled_conn, [(1, f"q{i}", f"reply {i % 2}", "farmer", None, timestamp) for i, timestamp in
+                               enumerate(["2026-01-05T10:00:00", "2026-02-01T10:00:00", "2026-01-31T23:59:59",
+                                          "2026-03-01T00:00:00", "2026-02-14T08:00:00"])])
+    daily = rollup_counts(pooled_conn)
+
+    batches = list(app.archive_searches(pooled_conn, "2026-03-01", batch_size=2, archive_dir=tmp_path))
+    assert batches == [(2, {"2026-01": 1, "2026-02": 1}), (2, {"2026-01": 1, "2026-02": 1})]
+    assert [tuple(r) for r in pooled_conn.execute("SELECT question, reply FROM search_log")] == [("q3", "reply 1")]
+    january = sqlite3.connect(app.archive_path("2026-01", tmp_path))
+    assert january.execute("SELECT question, reply, timestamp FROM searches ORDER BY id").fetchall() == [
+        ("q0", "reply 0", "2026-01-05T10:00:00"), ("q2", "reply 0", "2026-01-31T23:59:59")]
+    assert rollup_counts(pooled_conn) == daily
+    assert list(app.archive_searches(pooled_conn, "2026-03-01", archive_dir=tmp_path)) == []
+
+
+def test_incremental_vacuum_releases_archived_pages(pooled_conn, tmp_path):
+    log_searches(pooled_conn, [(1, "x" * 1000, None, None, None, "2026-01-01T00:00:00")] * 2000)
+    for _ in app.archive_searches(pooled_conn, "2026-02-01", archive_dir=tmp_path):
+        pass
+    pages = pooled_conn.execute("PRAGMA page_count").fetchone()[0]
+    free = pooled_conn.execute("PRAGMA freelist_count").fetchone()[0]
+    assert free > 100
+
+    assert app.incremental_vacuum(pooled_conn, step_pages=100, pause=0) == free
+    assert pooled_conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert pooled_conn.execute("PRAGMA page_count").fetchone()[0] == pages - free
+
+
+# ---- Sessions (server-side) ----
+@pytest.fixture
+def server_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "password_hasher", app.PasswordHasher("pbkdf2:sha256:1000", offload=False))
+    flask_app = app.create_app({"DATABASE": str(tmp_path / "test.db"), "MIGRATE_ON_START": True,
+                                "SESSION_BACKEND": "sqlite"})
+    client = flask_app.test_client()
+    client.post("/signup", data={"name": "Zee", "email": "zz@gmail.com", "phone": "1", "password": "pw"})
+    return client
+
+
+def login(client):
+    response = client.post("/login", data={"email": "zz@gmail.com", "password": "pw"})
+    assert response.status_code == 302
+    return response
+
+
+def session_id(client):
+    cookie = client.get_cookie("session")
+    return cookie and cookie.value
+
+
+def test_saving_the_session_needs_no_second_connection(server_client):
+    pool = app.app_state(server_client.application).pool
+    pool.size, pool.timeout = 1, 0.1
+    login(server_client)
+    assert ask(server_client, "farmer schemes")["category"] == "farmer"
+
+
+def test_login_issues_a_new_session_id(server_client):
+    store = app.app_state(server_client.application).session_store
+    ask(server_client, "farmer schemes")
+    before = session_id(server_client)
+    assert store.load(before) is not None
+
+    login(server_client)
+    after = session_id(server_client)
+    assert after != before
+    assert store.load(before) is None
+    assert json.loads(store.load(after)[0])["last_category"] == "farmer"
+
+
+def test_unchanged_sessions_are_not_saved(server_client, monkeypatch):
+    store = app.app_state(server_client.application).session_store
+    ask(server_client, "farmer schemes")
+    saves = []
+    monkeypatch.setattr(store, "save", lambda *args: saves.append(args))
+    monkeypatch.setattr(store, "touch", lambda *args: saves.append(args))
+    ask(server_client, "farmer schemes")
+    ask(server_client, "how much is it")
+    assert saves == []
+    ask(server_client, "student schemes")
+    assert len(saves) == 1
+
+
+# ---- Password hashing ----
+@pytest.mark.parametrize("method", ["scrypt", "scrypt:16384:8:1", "pbkdf2", "pbkdf2:sha512", "pbkdf2:sha256:1000"])
+def test_method_prefix_matches_stored_hashes_without_hashing(method, monkeypatch):
+    stored = generate_password_hash("pw", method=method)
+    hasher = app.PasswordHasher(method, offload=False)
+    monkeypatch.setattr(app, "generate_password_hash", None)
+    assert not hasher.needs_rehash(stored)
+    assert hasher.needs_rehash(generate_password_hash("pw", method="pbkdf2:sha256:999"))
+
+
+# ---- Account summaries ----
+def summary(user_id, domain, total_users=10, family_count=3):
+    return {"user": {"id": user_id, "email_domain": domain}, "domain": domain, "family_count": family_count,
+            "total_users": total_users, "login_history": []}
+
+
+def test_account_cache_invalidation():
+    cache = app.AccountSummaryCache()
+    cache.put(1, summary(1, "gmail.com"))
+    cache.put(2, summary(2, "gmail.com"))
+    cache.put(3, summary(3, "ap.gov.in"))
+    assert cache.get(1) == summary(1, "gmail.com")
+
+    cache.invalidate_user(1)
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
+
+    cache.invalidate_counts("gmail.com")  # totals are shared, so every entry misses until refilled
+    assert cache.get(2) is None and cache.get(3) is None
+    cache.put(3, summary(3, "ap.gov.in", total_users=11))
+    assert cache.get(3)["total_users"] == 11
+    assert cache.get(2) is None  # its domain count is still gone
+    cache.put(2, summary(2, "gmail.com", total_users=11, family_count=4))
+    assert cache.get(2)["family_count"] == 4
+
+    cache.invalidate_counts()
+    cache.put(3, summary(3, "ap.gov.in", total_users=12))
+    assert cache.get(2) is None
+    assert cache.get(3)["total_users"] == 12
+
+
+def test_account_cache_entries_expire():
+    cache = app.AccountSummaryCache(ttl=0)
+    cache.put(1, summary(1, ""))
+    assert cache.get(1) is None
+
+
+def test_account_page_follows_signups_and_logins(server_client):
+    server_client.application.jinja_env.loader = jinja2.DictLoader({
+        "account.html": "{{ family_count }} {{ total_users }} {{ login_history | length }}"})
+    login(server_client)
+    assert server_client.get("/account").text == "1 1 1"
+    assert server_client.get("/account").text == "1 1 1"
+    assert app.app_state(server_client.application).account_cache.stats["hits"] == 1
+
+    server_client.post("/signup", data={"name": "Vee", "email": "vv@gmail.com", "phone": "2", "password": "pw"})
+    assert server_client.get("/account").text == "2 2 1"
+    server_client.post("/signup", data={"name": "Yo", "email": "yo@yahoo.com", "phone": "3", "password": "pw"})
+    assert server_client.get("/account").text == "2 3 1"
+
+    server_client.get("/logout")
+    login(server_client)
+    assert server_client.get("/account").text == "2 3 2"
+
+
+# ---- Page cache ----
+@pytest.fixture
+def page_client(client):
+    client.application.jinja_env.loader = jinja2.FileSystemLoader(app.APP_DIR)
+    return client
+
+
+def test_cached_pages_are_compressed_per_encoding(page_client):
+    plain = page_client.get("/")
+    gzipped = page_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gzipped.data) == plain.data
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+    assert "Accept-Encoding" in gzipped.headers["Vary"]
+
+
+def test_cached_pages_revalidate_with_their_etag(page_client):
+    headers = {"Accept-Encoding": "gzip"}
+    first = page_client.get("/", headers=headers)
+    hits = app.page_cache.stats["hits"]
+    etag = first.headers["ETag"]
+    for match in (etag, f'"other", W/{etag}', "*"):
+        not_modified = page_client.get("/", headers={**headers, "If-None-Match": match})
+        assert not_modified.status_code == 304
+        assert not_modified.data == b""
+        assert not_modified.headers["ETag"] == etag
+    # a different encoding is a different representation
+    assert page_client.get("/", headers={"If-None-Match": etag}).status_code == 200
+    assert app.page_cache.stats["hits"] == hits + 4
+
+
+# ---- Chatbot follow-ups ----
+def test_follow_ups_answer_for_the_last_category(client):
+    farmer = app.schemes_db["farmer"]
+    assert ask(client, "tell me farmer schemes")["category"] == "farmer"
+
+    reply = ask(client, "how to apply online?")
+    assert reply == {"reply": farmer["apply"], "category": None}
+    assert ask(client, "how much is it")["reply"] == farmer["amount"]
+    assert ask(client, "apply for this one")["reply"] == farmer["apply"]
+    with client.session_transaction() as sess:
+        assert sess["last_category"] == "farmer"
+
+
+def test_scheme_names_still_found_without_context(client):
+    reply = ask(client, "how to apply for PM Kisan")
+    assert reply["category"] == "farmer"
+    assert "PM Kisan" in reply["reply"]
+
+
+def test_follow_ups_naming_a_scheme_get_that_scheme(client):
+    assert ask(client, "student schemes")["category"] == "student"
+    reply = ask(client, "How to apply for PM Kisan")
+    assert reply["category"] == "farmer"
+    assert "PM Kisan" in reply["reply"]
+    assert ask(client, "how much is it")["reply"] == app.schemes_db["farmer"]["amount"]
+
+
+def test_words_outside_scheme_names_do_not_match(client):
+    # "help" is a "self help" alias and appears in apply text, but no scheme is named for it
+    assert ask(client, "homework help")["category"] is None
+    assert ask(client, "how to apply online?")["category"] is None
+    with client.session_transaction() as sess:
+        assert "last_category" not in sess
+
+
+def test_chat_views_need_no_async_support_under_wsgi(client, monkeypatch):
+    monkeypatch.setitem(sys.modules, "asgiref", None)  # Flask's async views would need it
+    assert ask(client, "tell me farmer schemes")["category"] == "farmer"
+
+
+# ---- Chatbot batch ----
+def logged_searches(client):
+    state = app.app_state(client.application)
+    state.search_log.flush()
+    conn = state.pool.acquire()
+    try:
+        rows = conn.execute("SELECT question, reply, category, timestamp FROM search_log ORDER BY id")
+        return ([tuple(r) for r in rows],
+                conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0])
+    finally:
+        state.pool.release(conn)
+
+
+def test_batch_answers_in_order_with_follow_ups(client):
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+    farmer = app.schemes_db["farmer"]
+    response = client.post("/chatbot_api/batch", json={"messages": [
+        {"message": "farmer schemes", "timestamp": "2026-03-01T23:30:00-05:30"},
+        "how much is it",
+        {"message": "  "},
+        {"message": "how much is it", "timestamp": "2026-03-02T10:00:00+00:00"},
+        {"message": "how to apply?", "timestamp": "2026-03-02T10:01:00"},
+    ]})
+    assert response.status_code == 200
+    replies = response.get_json()["replies"]
+    assert [r["category"] for r in replies] == ["farmer", None, None, None, None]
+    assert [r["reply"] for r in replies[1:]] == [farmer["amount"], "Please type a question.", farmer["amount"],
+                                                  farmer["apply"]]
+    with client.session_transaction() as sess:
+        assert sess["last_category"] == "farmer"
+
+    rows, replies_stored = logged_searches(client)
+    assert [r[0] for r in rows] == ["farmer schemes", "how much is it", "how much is it", "how to apply?"]
+    assert [r[3] for r in rows[:1] + rows[2:]] == ["2026-03-02T05:00:00", "2026-03-02T10:00:00",
+                                                   "2026-03-02T10:01:00"]
+    assert rows[1][1] == rows[2][1] == farmer["amount"]
+    assert replies_stored == 3  # the repeated reply is stored once
+
+
+@pytest.mark.parametrize("timestamp", ["yesterday", 1772323200, "2026-13-01T00:00:00"])
+def test_batch_rejects_bad_timestamps(client, timestamp):
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+    response = client.post("/chatbot_api/batch", json={"messages": [
+        "farmer schemes", {"message": "how much is it", "timestamp": timestamp}]})
+    assert response.status_code == 400
+    assert "messages[1]" in response.get_json()["error"]
+    with client.session_transaction() as sess:
+        assert "last_category" not in sess
+    assert logged_searches(client) == ([], 0)
+
+
+# ---- Alert streams ----
+def test_alert_streams_are_not_served_over_wsgi(client):
+    assert client.get("/category/farmer/alerts/stream").status_code == 204
+    assert client.get("/category/nope/alerts/stream").status_code == 404
+
+
+# ---- Search log ----
+def test_reply_interner_eviction_keeps_the_batch_resolvable(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    app.migrate_db(conn)
+    interner = app.ReplyInterner(max_entries=2)
+    interner.rows(conn, [(1, "q", "a", None, None, "t")])
+
+    rows = interner.rows(conn, [(1, "q", reply, None, None, "t") for reply in ("a", "b", "c", "a", None)])
+    ids = dict(conn.execute("SELECT text, id FROM replies"))
+    assert [r[2] for r in rows] == [ids["a"], ids["b"], ids["c"], ids["a"], None]
+
+
+# ---- ASGI serving ----
+def asgi_post(asgi_app, path, chunks, headers=()):
+    """POST `chunks` as a body without Content-Length; returns (status, body)."""
+    scope = {"type": "http", "method": "POST", "path": path, "root_path": "", "query_string": b"",
+             "http_version": "1.1", "scheme": "http", "server": ("localhost", 80), "client": ("127.0.0.1", 1),
+             "headers": [(b"content-type", b"application/json"), (b"transfer-encoding", b"chunked"), *headers]}
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.mark.parametrize("path", ["/chatbot_api", "/chatbot_api/batch"])
+def test_chunked_posts_reach_the_view(client, path):
+    asgi_app = app.AsgiApp(client.application)
+    payload = {"message": "farmer schemes"} if path == "/chatbot_api" else {"messages": ["farmer schemes"]}
+    body = json.dumps(payload).encode()
+    status, response = asgi_post(asgi_app, path, [body[:7], body[7:]])
+    assert status == 200
+    assert "farmer" in response.decode()